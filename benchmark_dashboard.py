@@ -0,0 +1,96 @@
+# benchmark_dashboard.py
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Abrir o monitor deve parecer instantâneo: janela com os números em até ~300 ms
+TARGET_WINDOW_MS = 300
+
+
+def run_child(spawned_at):
+    """Processo medido: interpretador novo, importa o dashboard e abre a janela"""
+    import tkinter as tk
+
+    started = time.perf_counter()
+    import dashBoard
+    imported = time.perf_counter()
+
+    root = tk.Tk()
+    app = dashBoard.FusionMonitor(root)
+    root.update()  # Primeira pintura da janela com os painéis numéricos
+    window_at = time.time()
+    result = {
+        "importacao_ms": 1000 * (imported - started),
+        "janela_ms": 1000 * (window_at - spawned_at),
+    }
+
+    def wait_for_charts():
+        if not app.charts_ready:
+            root.after(5, wait_for_charts)
+            return
+        root.update()
+        result["graficos_ms"] = 1000 * (time.time() - spawned_at)
+        print(json.dumps(result))
+        app.on_closing()
+
+    root.after(5, wait_for_charts)
+    root.mainloop()
+
+
+def measure(runs):
+    """Executa o dashboard `runs` vezes, cada uma num processo novo (partida a frio)"""
+    workdir = tempfile.mkdtemp(prefix="fusion_dash_bench_")  # Sem fusion_data.json: dashboard aguardando dados
+    script = os.path.abspath(__file__)  # O diretório do script entra no sys.path do filho
+    samples = []
+    for _ in range(runs):
+        spawned_at = time.time()
+        proc = subprocess.run([sys.executable, script, "--filho", str(spawned_at)],
+                              cwd=workdir, capture_output=True, text=True, timeout=60)
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "falha no dashboard")
+        samples.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    return {key: statistics.median(sample[key] for sample in samples) for key in samples[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede o tempo de abertura do dashboard (partida a frio)")
+    parser.add_argument("--execucoes", type=int, default=5, help="aberturas medidas (padrão: 5; vale a mediana)")
+    parser.add_argument("--alvo-ms", type=float, default=TARGET_WINDOW_MS,
+                        help=f"tempo máximo até a janela aparecer (padrão: {TARGET_WINDOW_MS})")
+    parser.add_argument("--filho", type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.filho is not None:
+        run_child(args.filho)
+        return 0
+
+    if sys.platform.startswith("linux") and not os.environ.get("DISPLAY"):
+        print("❌ O benchmark abre janelas Tk: é preciso um display (DISPLAY)")
+        return 2
+
+    print(f"🏁 Abrindo o dashboard {args.execucoes} vezes...")
+    try:
+        results = measure(args.execucoes)
+    except RuntimeError as e:
+        print(f"❌ Erro ao abrir o dashboard: {e}")
+        return 2
+
+    print("📊 Mediana:")
+    print(f"  importação do dashBoard: {results['importacao_ms']:.0f} ms")
+    print(f"  janela com os números:   {results['janela_ms']:.0f} ms (desde o início do processo)")
+    print(f"  gráficos prontos:        {results['graficos_ms']:.0f} ms")
+
+    if results["janela_ms"] > args.alvo_ms:
+        print(f"❌ Janela acima do alvo de {args.alvo_ms:.0f} ms")
+        return 1
+    print(f"✅ Dentro do alvo de {args.alvo_ms:.0f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,282 @@
+# benchmark_server.py
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import websockets
+
+BASELINE_PATH = "bench_baseline.json"
+
+# Métrica -> True se maior é melhor (usado na comparação com a baseline)
+METRICS = {
+    "mensagens_por_segundo": True,
+    "ack_p50_ms": False,
+    "ack_p99_ms": False,
+    "lag_loop_p99_ms": False,
+    "memoria_por_cliente_kb": False,
+}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def rss_kb(pid):
+    """Memória residente do processo em KB (Linux); None se indisponível"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+class LagMonitor:
+    """Mede o atraso do event loop: quanto um sleep curto passa do tempo pedido"""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.samples = []
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - start - self.interval))
+
+
+def run_server(port, workdir, ready, stop, results, workers=False):
+    """Processo do servidor: FusionServer real + monitor de lag do event loop"""
+    os.chdir(workdir)
+    sys.stdout = open(os.devnull, 'w')  # Os prints por mensagem não entram na medição do cliente
+    asyncio.run(_serve(port, ready, stop, results, workers))
+
+
+async def _serve(port, ready, stop, results, workers):
+    from fusion_analyzer import FusionServer
+
+    server = FusionServer(workers=workers)
+    server.start()
+    lag = LagMonitor()
+    lag_task = asyncio.create_task(lag.run())
+
+    async with websockets.serve(server.handle_client, "127.0.0.1", port):
+        ready.set()
+        while not stop.is_set():
+            await asyncio.sleep(0.1)
+
+    lag_task.cancel()
+    await server.stop()
+    results.put(sorted(lag.samples))
+
+
+def reactor_sample(rng):
+    return {
+        "plasma_temperature": rng.uniform(4e7, 1.2e8),
+        "case_temperature": rng.uniform(1e6, 5e7),
+        "injection_rate": 2 * rng.randint(1, 49),
+        "deuterium": {"name": "mekanism:deuterium", "amount": rng.randint(0, 1000000)},
+        "deuterium_capacity": 1000000,
+        "water": rng.randint(0, 1000000),
+        "water_capacity": 1000000,
+        "steam": rng.randint(0, 1000000),
+        "steam_capacity": 1000000,
+        "production_rate": rng.uniform(0, 1e6),
+        "energy": rng.uniform(0, 1e9),
+        "max_energy": 1e9,
+    }
+
+
+def turbine_sample(rng):
+    return {
+        "flow_rate": rng.randint(0, 100000),
+        "max_flow_rate": 100000,
+        "steam": rng.randint(0, 1000000),
+        "steam_capacity": 1000000,
+        "production_rate": rng.uniform(0, 1e6),
+        "max_production": 1e6,
+        "energy": rng.uniform(0, 1e9),
+        "max_energy": 1e9,
+    }
+
+
+async def fake_client(index, url, interval, deadline, latencies, counters):
+    """Simula um computador do ComputerCraft: reator, turbina e ping a cada ciclo"""
+    rng = random.Random(index)
+    device_id = f"sim-{index}"
+
+    async with websockets.connect(url, max_queue=None) as websocket:
+        await websocket.recv()  # Boas-vindas
+        counters["conectados"] += 1
+        await asyncio.sleep(rng.uniform(0, interval))  # Espalha os clientes no tempo
+
+        cycle = 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            messages = [("dados_reator", reactor_sample(rng)), ("dados_turbina", turbine_sample(rng))]
+            if cycle % 5 == 0:
+                messages.append(("ping", None))
+
+            for message_type, dados in messages:
+                payload = {"tipo": message_type, "id": device_id, "timestamp": time.time()}
+                if dados is not None:
+                    payload["dados"] = dados
+                sent_at = time.perf_counter()
+                await websocket.send(json.dumps(payload))
+                reply = json.loads(await websocket.recv())
+                if reply.get("tipo") in ("confirmacao", "pong"):
+                    latencies.append(time.perf_counter() - sent_at)
+                    counters["mensagens"] += 1
+                else:
+                    counters["erros"] += 1
+
+            cycle += 1
+            await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+
+async def run_clients(url, clients, duration, interval, on_connected):
+    latencies = []
+    counters = {"conectados": 0, "mensagens": 0, "erros": 0}
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+
+    tasks = [asyncio.create_task(fake_client(i, url, interval, deadline, latencies, counters))
+             for i in range(clients)]
+
+    # Mede a memória do servidor quando todos os clientes estiverem conectados
+    while counters["conectados"] < clients and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    on_connected()
+
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    counters["erros"] += sum(1 for r in results if isinstance(r, Exception))
+    elapsed = time.perf_counter() - started
+    return sorted(latencies), counters, elapsed
+
+
+def run_benchmark(args):
+    # Snapshot, histórico e checkpoint do servidor medido vão para um diretório removido no fim
+    with tempfile.TemporaryDirectory(prefix="fusion_bench_") as workdir:
+        return measure_server(args, workdir)
+
+
+def measure_server(args, workdir):
+    context = multiprocessing.get_context("spawn")
+    ready, stop, lag_results = context.Event(), context.Event(), context.Queue()
+    server = context.Process(target=run_server,
+                             args=(args.porta, workdir, ready, stop, lag_results, args.processos))
+    server.start()
+    if not ready.wait(10):
+        server.terminate()
+        server.join(10)
+        raise RuntimeError("servidor não iniciou")
+
+    rss_idle = rss_kb(server.pid)
+    rss_loaded = {}
+
+    def on_connected():
+        rss_loaded["kb"] = rss_kb(server.pid)
+
+    try:
+        latencies, counters, elapsed = asyncio.run(run_clients(
+            f"ws://127.0.0.1:{args.porta}", args.clientes, args.duracao, args.intervalo, on_connected))
+    finally:
+        stop.set()
+        lag = lag_results.get(timeout=10)
+        server.join(10)
+
+    memory_per_client = None
+    if rss_idle is not None and rss_loaded.get("kb") is not None:
+        memory_per_client = max(0, rss_loaded["kb"] - rss_idle) / args.clientes
+
+    return {
+        "data": datetime.now().isoformat(),
+        "parametros": {"clientes": args.clientes, "duracao_s": args.duracao, "intervalo_s": args.intervalo,
+                       "processos": args.processos},
+        "resultados": {
+            "mensagens": counters["mensagens"],
+            "erros": counters["erros"],
+            "mensagens_por_segundo": counters["mensagens"] / elapsed,
+            "ack_p50_ms": 1000 * percentile(latencies, 0.50),
+            "ack_p99_ms": 1000 * percentile(latencies, 0.99),
+            "ack_max_ms": 1000 * (latencies[-1] if latencies else 0.0),
+            "lag_loop_p99_ms": 1000 * percentile(lag, 0.99),
+            "lag_loop_max_ms": 1000 * (lag[-1] if lag else 0.0),
+            "memoria_por_cliente_kb": memory_per_client,
+        },
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Compara com a baseline; retorna a lista de métricas que pioraram além da tolerância"""
+    if baseline.get("parametros") != results["parametros"]:
+        print("⚠️  Parâmetros diferentes da baseline: comparação apenas indicativa")
+
+    regressions = []
+    for metric, higher_is_better in METRICS.items():
+        current = results["resultados"].get(metric)
+        reference = baseline["resultados"].get(metric)
+        if current is None or not reference:
+            continue
+        change = (current - reference) / reference
+        worse = -change if higher_is_better else change
+        mark = "❌" if worse > tolerance else "✅"
+        print(f"  {mark} {metric}: {reference:.2f} -> {current:.2f} ({change:+.1%})")
+        if worse > tolerance:
+            regressions.append(metric)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gerador de carga e benchmark do servidor Fusion")
+    parser.add_argument("--clientes", type=int, default=50, help="clientes CC simulados (padrão: 50)")
+    parser.add_argument("--duracao", type=float, default=10, metavar="SEG", help="duração do teste (padrão: 10)")
+    parser.add_argument("--intervalo", type=float, default=2, metavar="SEG",
+                        help="intervalo entre ciclos de cada cliente (padrão: 2, como o script Lua)")
+    parser.add_argument("--porta", type=int, default=8799, help="porta local do servidor de teste (padrão: 8799)")
+    parser.add_argument("--processos", action="store_true",
+                        help="servidor no modo multiprocesso (histórico/análise/snapshot em processos próprios)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help=f"arquivo da baseline (padrão: {BASELINE_PATH})")
+    parser.add_argument("--salvar-baseline", action="store_true", help="grava o resultado como nova baseline")
+    parser.add_argument("--tolerancia", type=float, default=0.2,
+                        help="piora relativa aceita antes de acusar regressão (padrão: 0.2)")
+    args = parser.parse_args()
+
+    print(f"🏁 Benchmark: {args.clientes} clientes, {args.duracao:.0f}s, ciclo de {args.intervalo}s")
+    results = run_benchmark(args)
+
+    print("📊 Resultados:")
+    for metric, value in results["resultados"].items():
+        print(f"  {metric}: {value:.2f}" if isinstance(value, float) else f"  {metric}: {value}")
+
+    if args.salvar_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"💾 Baseline salva em {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"📐 Comparando com {args.baseline} ({baseline.get('data', '?')}):")
+        if compare(results, baseline, args.tolerancia):
+            print("❌ Regressão de desempenho detectada")
+            return 1
+        print("✅ Sem regressões")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
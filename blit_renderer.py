@@ -0,0 +1,101 @@
+# blit_renderer.py
+import time
+from collections import deque
+
+import numpy as np
+
+
+class FrameStats:
+    """Estatísticas dos últimos quadros renderizados"""
+
+    def __init__(self, window=120):
+        self.durations = deque(maxlen=window)
+        self.timestamps = deque(maxlen=window)
+        self.full_redraws = 0
+        self.blits = 0
+
+    def record(self, duration, full_redraw):
+        self.durations.append(duration)
+        self.timestamps.append(time.perf_counter())
+        if full_redraw:
+            self.full_redraws += 1
+        else:
+            self.blits += 1
+
+    def summary(self):
+        """Tempo médio/p95/máximo por quadro (ms) e taxa de quadros efetiva"""
+        if not self.durations:
+            return {"quadros": 0, "media_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0, "fps": 0.0,
+                    "redesenhos_completos": self.full_redraws, "blits": self.blits}
+        durations = sorted(self.durations)
+        elapsed = self.timestamps[-1] - self.timestamps[0]
+        return {
+            "quadros": len(durations),
+            "media_ms": 1000 * sum(durations) / len(durations),
+            "p95_ms": 1000 * durations[min(len(durations) - 1, int(0.95 * len(durations)))],
+            "max_ms": 1000 * durations[-1],
+            "fps": (len(self.timestamps) - 1) / elapsed if elapsed > 0 else 0.0,
+            "redesenhos_completos": self.full_redraws,
+            "blits": self.blits,
+        }
+
+
+class BlitRenderer:
+    """Redesenha só as linhas de um eixo via blitting; o fundo é refeito apenas quando a escala muda"""
+
+    def __init__(self, canvas, ax, lines, x_headroom=0.25, y_margin=0.1):
+        self.canvas = canvas
+        self.ax = ax
+        self.lines = lines
+        self.x_headroom = x_headroom
+        self.y_margin = y_margin
+        self.background = None
+
+        for line in self.lines:
+            line.set_animated(True)
+        # Todo redesenho completo (inclusive redimensionar a janela) recaptura o fundo
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+
+    def _on_draw(self, event):
+        self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+        for line in self.lines:
+            self.ax.draw_artist(line)
+
+    def render(self, x, ys):
+        """Atualiza os dados das linhas e desenha o eixo; True se precisou de redesenho completo"""
+        for line, y in zip(self.lines, ys):
+            line.set_data(x, y)
+
+        full_redraw = self._rescale_if_needed(x, ys) or self.background is None
+        if full_redraw:
+            self.canvas.draw()
+        else:
+            self.canvas.restore_region(self.background)
+            for line in self.lines:
+                self.ax.draw_artist(line)
+            self.canvas.blit(self.ax.bbox)
+        return full_redraw
+
+    def _rescale_if_needed(self, x, ys):
+        """Muda os limites só quando os dados saem da área visível"""
+        if len(x) == 0:
+            return False
+
+        x_min, x_max = float(x[0]), float(x[-1])
+        y_values = np.concatenate(ys)
+        if np.isnan(y_values).all():
+            return False
+        y_min, y_max = float(np.nanmin(y_values)), float(np.nanmax(y_values))
+
+        cur_x0, cur_x1 = self.ax.get_xlim()
+        cur_y0, cur_y1 = self.ax.get_ylim()
+        if cur_x0 <= x_min and x_max <= cur_x1 and y_min >= cur_y0 and y_max <= cur_y1:
+            return False
+
+        # Folga à direita evita redesenhar o fundo a cada nova amostra
+        x_span = max(x_max - x_min, 1.0)
+        self.ax.set_xlim(x_min, x_max + x_span * self.x_headroom)
+
+        y_pad = max(y_max - y_min, abs(y_max), 1.0) * self.y_margin
+        self.ax.set_ylim(y_min - y_pad, y_max + y_pad)
+        return True
@@ -0,0 +1,120 @@
+# client_connection.py
+import asyncio
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger("fusion")
+
+# Políticas quando a fila de saída de um cliente enche
+OVERFLOW_POLICIES = ("descartar_antigas", "coalescer", "desconectar")
+
+
+class ClientConnection:
+    """Fila de saída limitada de um cliente, esvaziada por uma tarefa própria.
+
+    Quem produz mensagens nunca espera pelo cliente: send() só enfileira.
+    """
+
+    def __init__(self, websocket, name, max_queue=256, policy="descartar_antigas", on_drop=None, on_sent=None):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"política de fila desconhecida: {policy}")
+        self.websocket = websocket
+        self.name = name
+        self.max_queue = max_queue
+        self.policy = policy
+        self.on_drop = on_drop  # Callback(motivo) para métricas
+        self.on_sent = on_sent  # Callback(segundos na fila) para métricas
+        self.dropped = 0
+        self.sent = 0
+        self.closed = False
+        self._queue = deque()  # Entradas [chave, payload, enfileirada_em]
+        self._pending_keys = {}  # chave -> entrada ainda na fila (política coalescer)
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._close_task = None  # Fechamento do websocket pedido pela política "desconectar"
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def send(self, payload, key=None):
+        """Enfileira uma mensagem já serializada; retorna False se foi descartada"""
+        if self.closed:
+            return False
+
+        if key is not None and self.policy == "coalescer":
+            entry = self._pending_keys.get(key)
+            if entry is not None:
+                # Substitui a mensagem antiga pela mais nova, sem mudar a posição na fila
+                entry[1] = payload
+                self._dropped("coalescida")
+                return True
+
+        if len(self._queue) >= self.max_queue:
+            if self.policy == "desconectar":
+                self._dropped("desconexao")
+                self.close()
+                self._close_task = asyncio.create_task(self.websocket.close(code=1013, reason="fila de saída cheia"))
+                self._close_task.add_done_callback(self._close_done)
+                return False
+            oldest = self._queue.popleft()
+            if oldest[0] is not None:
+                self._pending_keys.pop(oldest[0], None)
+            self._dropped("fila_cheia")
+
+        entry = [key, payload, time.monotonic()]
+        self._queue.append(entry)
+        if key is not None and self.policy == "coalescer":
+            self._pending_keys[key] = entry
+        self._wakeup.set()
+        return True
+
+    def _dropped(self, reason):
+        self.dropped += 1
+        if self.on_drop is not None:
+            self.on_drop(reason)
+
+    @property
+    def depth(self):
+        return len(self._queue)
+
+    @property
+    def lag(self):
+        """Há quanto tempo a mensagem mais antiga espera na fila (segundos)"""
+        if not self._queue:
+            return 0.0
+        return time.monotonic() - self._queue[0][2]
+
+    def close(self):
+        self.closed = True
+        self._queue.clear()
+        self._pending_keys.clear()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._close_task is not None and not self._close_task.done():
+            # Handler do cliente já encerrou: não há mais handshake de fechamento para esperar
+            self._close_task.cancel()
+
+    def _close_done(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Erro ao desconectar %s: %s", self.name, task.exception())
+
+    async def _run(self):
+        queue = self._queue
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while queue:
+                key, payload, enqueued_at = queue.popleft()
+                if key is not None:
+                    self._pending_keys.pop(key, None)
+                try:
+                    await self.websocket.send(payload)
+                except Exception:
+                    # Conexão caiu: o handler do cliente faz a limpeza
+                    self.closed = True
+                    return
+                self.sent += 1
+                if self.on_sent is not None:
+                    self.on_sent(time.monotonic() - enqueued_at)
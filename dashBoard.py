@@ -1,42 +1,79 @@
 # fusion_monitor_advanced.py
 import tkinter as tk
 from tkinter import ttk
+import argparse
 import json
 import threading
 import time
 from datetime import datetime
 import os
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import matplotlib.animation as animation
-from matplotlib import style
+import numpy as np
+from ring_buffer import ColumnarRingBuffer
+from blit_renderer import BlitRenderer, FrameStats
+from dashboard_profiler import NO_TRACE, StageProfiler
 
-# Configurar estilo dos gráficos
-style.use('dark_background')
-plt.rcParams['axes.facecolor'] = '#1e1e1e'
-plt.rcParams['figure.facecolor'] = '#2d2d2d'
+DEFAULT_DEVICE_ID = "principal"  # Mesmo id padrão do servidor
+
+# O matplotlib (~1 s de importação) só é carregado depois que a janela aparece, em segundo plano
+_plotting = {}
+
+
+def load_plotting():
+    """Importa o matplotlib e aplica o estilo dos gráficos (pode rodar fora da thread do Tk)"""
+    if not _plotting:
+        import matplotlib
+        import matplotlib.style
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        
+        # Configurar estilo dos gráficos
+        matplotlib.style.use('dark_background')
+        matplotlib.rcParams['axes.facecolor'] = '#1e1e1e'
+        matplotlib.rcParams['figure.facecolor'] = '#2d2d2d'
+        _plotting.update(Figure=Figure, FigureCanvasTkAgg=FigureCanvasTkAgg)
+    return _plotting
 
 class FusionMonitor:
-    def __init__(self, root):
+    def __init__(self, root, server_url=None, max_history=100, render_mode="completo", target_fps=20,
+                 device_id=None, replay_path=None, replay_method="minmax", profiler=None):
         self.root = root
+        self.server_url = server_url  # Se definido, recebe dados via WebSocket em vez do arquivo
+        self.device_id = device_id  # Reator/turbina exibidos (None = dispositivo principal)
         self.root.title("🏭 Fusion Reactor Monitor - Advanced")
         self.root.geometry("1200x800")
         self.root.configure(bg='#1e1e1e')
         
-        # Dados históricos para gráficos
-        self.time_data = []
-        self.plasma_temp_data = []
-        self.case_temp_data = []
-        self.injection_rate_data = []
-        self.energy_production_data = []
-        self.max_history = 100  # Pontos máximos no gráfico
+        # Dados históricos para gráficos (uma linha por atualização, colunas sempre alinhadas)
+        self.max_history = max_history  # Pontos máximos no gráfico
+        self.history = ColumnarRingBuffer(
+            ("time", "plasma_temperature", "case_temperature", "injection_rate", "energy_production"),
+            self.max_history)
+        
+        # Renderização: "completo" redesenha as figuras a cada amostra, "blit" só as linhas, limitado a target_fps
+        self.render_mode = render_mode
+        self.target_fps = target_fps
+        self.graphs_dirty = False
+        
+        # Tempo por etapa de cada atualização (--perfil); desligado, as marcas não fazem nada
+        self.profiler = profiler or StageProfiler()
+        
+        # Gráficos são montados depois que a janela aparece (ver start_chart_loading)
+        self.charts_ready = False
+        self.replay_path = replay_path
+        self.replay_method = replay_method
         
         # Configurar interface
         self.setup_ui()
+        self.running = True
+        self.start_chart_loading()
+        
+        if replay_path:
+            # Modo replay: histórico gravado pelo servidor, sem atualização ao vivo
+            return
         
         # Iniciar thread de atualização
-        self.running = True
-        self.update_thread = threading.Thread(target=self.update_loop, daemon=True)
+        loop_target = self.subscribe_loop if self.server_url else self.update_loop
+        self.update_thread = threading.Thread(target=loop_target, daemon=True)
         self.update_thread.start()
         
     def setup_ui(self):
@@ -46,6 +83,7 @@ class FusionMonitor:
         # Frame principal
         main_frame = ttk.Frame(self.root, padding="15", style='Dark.TFrame')
         main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.main_frame = main_frame
         
         # Configurar grid weights
         self.root.columnconfigure(0, weight=1)
@@ -63,6 +101,24 @@ class FusionMonitor:
         # Painel de Gráficos
         self.setup_graphs_panel(main_frame)
         
+        if self.profiler.enabled:
+            self.setup_profile_overlay()
+        
+    def setup_profile_overlay(self):
+        """Quadro sobreposto com o tempo por etapa, atualizado uma vez por segundo"""
+        self.profile_label = tk.Label(self.root, text="", justify=tk.LEFT, anchor=tk.NW, font=('Courier', 9),
+                                      bg='#000000', fg='#ffcc00', padx=6, pady=4)
+        self.profile_label.place(relx=1.0, x=-10, y=10, anchor=tk.NE)
+        
+        def refresh():
+            if not self.running:
+                return
+            self.profile_label.config(text=self.profiler.overlay_text())
+            self.profile_label.lift()
+            self.root.after(1000, refresh)
+        
+        self.root.after(1000, refresh)
+        
     def setup_styles(self):
         """Configura os estilos visuais"""
         style = ttk.Style()
@@ -101,6 +157,11 @@ class FusionMonitor:
                                        style='Subtitle.TLabel', foreground='#888888')
         self.timestamp_label.grid(row=3, column=0, sticky=tk.W, pady=(2, 0))
         
+        # Estatísticas de renderização (preenchidas no modo blit)
+        self.render_stats_label = ttk.Label(header_frame, text="", 
+                                          style='Subtitle.TLabel', foreground='#888888')
+        self.render_stats_label.grid(row=4, column=0, sticky=tk.W, pady=(2, 0))
+        
     def setup_metrics_panel(self, parent):
         """Configura o painel de métricas em tempo real"""
         metrics_frame = ttk.Frame(parent, style='Dark.TFrame')
@@ -195,28 +256,64 @@ class FusionMonitor:
         row += 1
         
     def setup_graphs_panel(self, parent):
-        """Configura o painel de gráficos"""
+        """Configura o painel de gráficos (só os quadros; as figuras vêm depois)"""
         graphs_frame = ttk.Frame(parent, style='Dark.TFrame')
         graphs_frame.grid(row=1, column=1, sticky=(tk.W, tk.E, tk.N, tk.S))
         graphs_frame.columnconfigure(0, weight=1)
         graphs_frame.rowconfigure(0, weight=1)
         graphs_frame.rowconfigure(1, weight=1)
         
-        # Gráfico de Temperaturas
-        self.setup_temperature_graph(graphs_frame)
-        
-        # Gráfico de Energia
-        self.setup_energy_graph(graphs_frame)
-        
-    def setup_temperature_graph(self, parent):
+        self.temp_frame = self.setup_graph_frame(graphs_frame, "📊 TEMPERATURAS DO REATOR", 0, (0, 5))
+        self.energy_frame = self.setup_graph_frame(graphs_frame, "⚡ PRODUÇÃO DE ENERGIA", 1, (5, 0))
+        
+    def setup_graph_frame(self, parent, title, row, pady):
+        frame = ttk.LabelFrame(parent, text=title, padding="10", style='Dark.TLabelframe')
+        frame.grid(row=row, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), pady=pady)
+        frame.columnconfigure(0, weight=1)
+        frame.rowconfigure(0, weight=1)
+        
+        # Substituído pela figura quando o matplotlib terminar de carregar
+        frame.placeholder = ttk.Label(frame, text="Carregando gráfico...", style='Metric.TLabel')
+        frame.placeholder.grid(row=0, column=0)
+        return frame
+        
+    def start_chart_loading(self):
+        """Importa o matplotlib numa thread e monta os gráficos quando terminar"""
+        loader = threading.Thread(target=load_plotting, daemon=True)
+        loader.start()
+        
+        def wait_for_loader():
+            if not self.running:
+                return
+            if loader.is_alive():
+                self.root.after(20, wait_for_loader)
+                return
+            self.build_charts()
+        
+        # after_idle: só depois que a janela com os painéis numéricos foi desenhada
+        self.root.after_idle(wait_for_loader)
+        
+    def build_charts(self):
+        """Cria as figuras (thread do Tk) e desenha o histórico acumulado enquanto carregavam"""
+        plotting = load_plotting()
+        self.setup_temperature_graph(self.temp_frame, plotting)
+        self.setup_energy_graph(self.energy_frame, plotting)
+        self.charts_ready = True
+        
+        if self.replay_path:
+            self.setup_replay(self.replay_path, self.replay_method)
+            return
+        if self.render_mode == "blit":
+            self.setup_blit_rendering()
+        self.update_graphs(None)
+        
+    def setup_temperature_graph(self, temp_frame, plotting):
         """Configura o gráfico de temperaturas"""
-        temp_frame = ttk.LabelFrame(parent, text="📊 TEMPERATURAS DO REATOR", padding="10", style='Dark.TLabelframe')
-        temp_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 5))
-        temp_frame.columnconfigure(0, weight=1)
-        temp_frame.rowconfigure(0, weight=1)
+        temp_frame.placeholder.destroy()
         
         # Criar figura do matplotlib
-        self.temp_fig, self.temp_ax = plt.subplots(figsize=(6, 3), facecolor='#2d2d2d')
+        self.temp_fig = plotting["Figure"](figsize=(6, 3), facecolor='#2d2d2d')
+        self.temp_ax = self.temp_fig.add_subplot()
         self.temp_ax.set_facecolor('#1e1e1e')
         
         # Configurar gráfico
@@ -232,18 +329,16 @@ class FusionMonitor:
         self.temp_ax.legend(facecolor='#2d2d2d', edgecolor='#444444', labelcolor='white')
         
         # Embed no tkinter
-        self.temp_canvas = FigureCanvasTkAgg(self.temp_fig, temp_frame)
+        self.temp_canvas = plotting["FigureCanvasTkAgg"](self.temp_fig, temp_frame)
         self.temp_canvas.get_tk_widget().grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         
-    def setup_energy_graph(self, parent):
+    def setup_energy_graph(self, energy_frame, plotting):
         """Configura o gráfico de energia"""
-        energy_frame = ttk.LabelFrame(parent, text="⚡ PRODUÇÃO DE ENERGIA", padding="10", style='Dark.TLabelframe')
-        energy_frame.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(5, 0))
-        energy_frame.columnconfigure(0, weight=1)
-        energy_frame.rowconfigure(0, weight=1)
+        energy_frame.placeholder.destroy()
         
         # Criar figura do matplotlib
-        self.energy_fig, self.energy_ax = plt.subplots(figsize=(6, 3), facecolor='#2d2d2d')
+        self.energy_fig = plotting["Figure"](figsize=(6, 3), facecolor='#2d2d2d')
+        self.energy_ax = self.energy_fig.add_subplot()
         self.energy_ax.set_facecolor('#1e1e1e')
         
         # Configurar gráfico
@@ -258,9 +353,138 @@ class FusionMonitor:
         self.energy_ax.legend(facecolor='#2d2d2d', edgecolor='#444444', labelcolor='white')
         
         # Embed no tkinter
-        self.energy_canvas = FigureCanvasTkAgg(self.energy_fig, energy_frame)
+        self.energy_canvas = plotting["FigureCanvasTkAgg"](self.energy_fig, energy_frame)
         self.energy_canvas.get_tk_widget().grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         
+    def setup_blit_rendering(self):
+        """Configura o modo de renderização por blitting com taxa de quadros limitada"""
+        self.frame_stats = FrameStats()
+        self.temp_renderer = BlitRenderer(self.temp_canvas, self.temp_ax,
+                                          [self.plasma_line, self.case_line])
+        self.energy_renderer = BlitRenderer(self.energy_canvas, self.energy_ax,
+                                            [self.energy_line])
+        self.last_stats_update = 0.0
+        self.root.after(self.frame_interval_ms(), self.render_tick)
+        
+    def frame_interval_ms(self):
+        return max(1, int(1000 / self.target_fps))
+        
+    def render_tick(self):
+        """Desenha no máximo um quadro por intervalo, independente da taxa de dados"""
+        if not self.running:
+            return
+        
+        if self.graphs_dirty and len(self.history) > 0:
+            self.graphs_dirty = False
+            trace = self.profiler.begin("quadro")
+            started = time.perf_counter()
+            time_data = self.history.view("time")
+            full_redraw = self.temp_renderer.render(time_data, (self.history.view("plasma_temperature"),
+                                                                self.history.view("case_temperature")))
+            trace.mark("temperatura")
+            full_redraw |= self.energy_renderer.render(time_data, (self.history.view("energy_production"),))
+            trace.mark("energia")
+            # Um registro por quadro, somando os dois eixos
+            self.frame_stats.record(time.perf_counter() - started, full_redraw)
+            self.profiler.finish(trace)
+        
+        # Atualiza o texto das estatísticas uma vez por segundo
+        now = time.time()
+        if now - self.last_stats_update >= 1.0:
+            self.last_stats_update = now
+            stats = self.frame_stats.summary()
+            self.render_stats_label.config(
+                text=f"Render: {stats['media_ms']:.1f} ms/quadro (p95 {stats['p95_ms']:.1f}, "
+                     f"máx {stats['max_ms']:.1f}) · {stats['fps']:.0f} fps")
+        
+        self.root.after(self.frame_interval_ms(), self.render_tick)
+        
+    def setup_replay(self, replay_path, method):
+        """Configura o modo replay: navegação e zoom sobre o histórico mapeado em memória"""
+        from history_replay import HistoryReplay
+        
+        device_id = self.device_id
+        if device_id is None:
+            from timeseries_store import TimeSeriesStore
+            reactors = [d for d in TimeSeriesStore(replay_path).devices() if d.startswith("reactor:")]
+            device_id = reactors[0].split(":", 1)[1] if reactors else "principal"
+        
+        self.replay_reactor = HistoryReplay(replay_path, f"reactor:{device_id}", method)
+        self.replay_turbine = HistoryReplay(replay_path, f"turbine:{device_id}", method)
+        
+        ranges = [r for r in (self.replay_reactor.time_range(("plasma_temperature", "case_temperature")),
+                              self.replay_turbine.time_range(("production_rate",))) if r]
+        if not ranges:
+            self.status_label.config(text=f"● Status: SEM HISTÓRICO ({device_id})", foreground='orange')
+            return
+        self.replay_start = min(r[0] for r in ranges)
+        self.replay_end = max(r[1] for r in ranges)
+        self.replay_span = max(self.replay_end - self.replay_start, 1.0)
+        self.replay_position = self.replay_end  # Fim da janela visível
+        
+        self.status_label.config(text=f"● Status: REPLAY ({device_id})", foreground='#44aaff')
+        
+        # Controles de navegação
+        controls = ttk.Frame(self.main_frame, style='Dark.TFrame')
+        controls.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(10, 0))
+        controls.columnconfigure(0, weight=1)
+        
+        self.replay_scale = ttk.Scale(controls, from_=self.replay_start, to=self.replay_end,
+                                      command=self.on_replay_seek)
+        self.replay_scale.set(self.replay_end)
+        self.replay_scale.grid(row=0, column=0, sticky=(tk.W, tk.E), padx=(0, 10))
+        ttk.Button(controls, text="🔍 +", command=lambda: self.zoom_replay(0.5)).grid(row=0, column=1)
+        ttk.Button(controls, text="🔍 −", command=lambda: self.zoom_replay(2.0)).grid(row=0, column=2)
+        ttk.Button(controls, text="Tudo", command=self.reset_replay_zoom).grid(row=0, column=3)
+        
+        self.replay_redraw()
+        
+    def on_replay_seek(self, value):
+        self.replay_position = float(value)
+        self.replay_redraw()
+        
+    def zoom_replay(self, factor):
+        self.replay_span = min(max(self.replay_span * factor, 10.0), self.replay_end - self.replay_start or 1.0)
+        self.replay_redraw()
+        
+    def reset_replay_zoom(self):
+        self.replay_span = max(self.replay_end - self.replay_start, 1.0)
+        self.replay_position = self.replay_end
+        self.replay_scale.set(self.replay_end)
+        self.replay_redraw()
+        
+    def replay_redraw(self):
+        """Redesenha a janela atual com cerca de um ponto por pixel"""
+        end = max(self.replay_position, self.replay_start + self.replay_span)
+        start = end - self.replay_span
+        max_points = max(100, int(self.temp_ax.bbox.width))
+        origin = self.replay_start
+        
+        time_data, plasma = self.replay_reactor.window("plasma_temperature", start, end, max_points)
+        self.plasma_line.set_data(time_data - origin, plasma)
+        time_data, case = self.replay_reactor.window("case_temperature", start, end, max_points)
+        self.case_line.set_data(time_data - origin, case)
+        time_data, production = self.replay_turbine.window("production_rate", start, end, max_points)
+        self.energy_line.set_data(time_data - origin, production * 10)  # RF -> J
+        
+        for ax, canvas in ((self.temp_ax, self.temp_canvas), (self.energy_ax, self.energy_canvas)):
+            ax.set_xlim(start - origin, end - origin)
+            ax.relim()
+            ax.autoscale_view(scalex=False)
+            canvas.draw_idle()
+        
+        # Painel de métricas mostra os valores no fim da janela
+        reactor_values = {field: self.replay_reactor.value_at(field, end)
+                          for field in ("plasma_temperature", "case_temperature", "injection_rate")}
+        turbine_values = {field: self.replay_turbine.value_at(field, end)
+                          for field in ("production_rate", "max_production", "flow_rate")}
+        self.update_reactor_display({k: v for k, v in reactor_values.items() if v is not None}, end)
+        self.update_turbine_display({k: v for k, v in turbine_values.items() if v is not None}, end)
+        
+        self.timestamp_label.config(
+            text=f"Janela: {datetime.fromtimestamp(start).strftime('%d/%m %H:%M:%S')} → "
+                 f"{datetime.fromtimestamp(end).strftime('%d/%m %H:%M:%S')}")
+        
     def update_loop(self):
         """Loop principal de atualização dos dados"""
         start_time = time.time()
@@ -270,11 +494,15 @@ class FusionMonitor:
                 current_time = time.time() - start_time
                 
                 if os.path.exists("fusion_data.json"):
+                    trace = self.profiler.begin()
                     with open("fusion_data.json", 'r') as f:
-                        new_data = json.load(f)
+                        raw = f.read()
+                    trace.mark("leitura")
+                    new_data = self.select_device(json.loads(raw))
+                    trace.mark("json")
                     
                     # Atualiza interface na thread principal
-                    self.root.after(0, self.update_interface, new_data, current_time)
+                    self.root.after(0, self.update_interface, new_data, current_time, trace)
                 
                 time.sleep(0.5)  # Atualiza a cada 0.5 segundos
                 
@@ -282,8 +510,113 @@ class FusionMonitor:
                 print(f"Erro no loop de atualização: {e}")
                 time.sleep(2)
                 
-    def update_interface(self, data, current_time):
+    def subscribe_loop(self):
+        """Loop de atualização no modo ao vivo (assinatura no servidor WebSocket)"""
+        import asyncio
+        
+        start_time = time.time()
+        
+        while self.running:
+            try:
+                asyncio.run(self.receive_samples(start_time))
+            except Exception as e:
+                print(f"Erro na conexão com o servidor: {e}")
+            
+            if self.running:
+                time.sleep(2)  # Aguarda antes de reconectar
+    
+    async def receive_samples(self, start_time):
+        """Assina o servidor e repassa cada amostra recebida para a interface"""
+        import websockets
+        
+        async with websockets.connect(self.server_url) as websocket:
+            subscription = {"tipo": "assinar"}
+            if self.device_id:
+                subscription["ids"] = [self.device_id]
+            await websocket.send(json.dumps(subscription))
+            print(f"📡 Inscrito em {self.server_url}")
+            
+            live_data = {"status": "aguardando_dados", "reactor": {}, "turbine": {}}
+            # Sem --dispositivo a inscrição recebe todos: só o principal de cada tipo vai para o painel
+            primary = {"reactor": None, "turbine": None}
+            async for message in websocket:
+                if not self.running:
+                    break
+                
+                trace = self.profiler.begin()
+                data = json.loads(message)
+                trace.mark("json")
+                message_type = data.get("tipo")
+                
+                if message_type == "snapshot":
+                    snapshot = data.get("dados", live_data)
+                    for kind in primary:
+                        primary[kind] = self.primary_id(snapshot.get(f"{kind}s", {}))
+                    live_data = self.select_device(snapshot)
+                elif message_type == "amostra":
+                    kind, device_id = data.get("dispositivo"), data.get("id")
+                    if not self.device_id:
+                        if kind not in primary:
+                            continue
+                        if primary[kind] is None or device_id == DEFAULT_DEVICE_ID:
+                            primary[kind] = device_id
+                        if device_id != primary[kind]:
+                            continue
+                    live_data[kind] = data.get("dados", {})
+                    if "derivados" in data:
+                        key = f"{data.get('dispositivo')}:{data.get('id')}"
+                        live_data["derivados"] = {**live_data.get("derivados", {}), key: data["derivados"]}
+                    live_data["status"] = data.get("status", "ativo")
+                elif message_type == "alertas":
+                    live_data["analise"] = data.get("dados", {})
+                else:
+                    continue
+                trace.mark("estado")
+                
+                # Atualiza interface na thread principal
+                current_time = time.time() - start_time
+                self.root.after(0, self.update_interface, dict(live_data), current_time, trace)
+    
+    @staticmethod
+    def primary_id(devices):
+        """Mesmo critério do servidor (primary_device): "principal" ou o primeiro anunciado"""
+        if DEFAULT_DEVICE_ID in devices:
+            return DEFAULT_DEVICE_ID
+        return next(iter(devices), None)
+        
+    def select_device(self, data):
+        """Troca os dados principais pelos do dispositivo escolhido em --dispositivo"""
+        if not self.device_id:
+            return data
+        selected = dict(data)
+        selected['reactor'] = data.get('reactors', {}).get(self.device_id, {})
+        selected['turbine'] = data.get('turbines', {}).get(self.device_id, {})
+        return selected
+        
+    def device_entry(self, devices, kind):
+        """Entrada do dispositivo exibido num mapa "tipo:id" -> valores enviado pelo servidor"""
+        if self.device_id:
+            return devices.get(f"{kind}:{self.device_id}")
+        # Mesmo critério do servidor para o dispositivo principal
+        return devices.get(f"{kind}:{DEFAULT_DEVICE_ID}") or next(
+            (value for key, value in devices.items() if key.startswith(f"{kind}:")), None)
+        
+    def device_alerts(self, data, kind):
+        """Alertas (já avaliados pelo servidor) do dispositivo exibido; None se o servidor não os enviou"""
+        devices = data.get('analise', {}).get('dispositivos')
+        if devices is None:
+            return None
+        entry = self.device_entry(devices, kind)
+        return entry.get('alertas', []) if entry else []
+        
+    def device_derived(self, data, kind):
+        """Métricas derivadas (calculadas pelo servidor) do dispositivo exibido; {} se não vieram"""
+        return self.device_entry(data.get('derivados', {}), kind) or {}
+        
+    def update_interface(self, data, current_time, trace=NO_TRACE):
         """Atualiza a interface com novos dados"""
+        trace.mark("fila")  # Espera até a thread do Tk executar a atualização
+        
         # Atualizar header
         self.timestamp_label.config(text=f"Última atualização: {datetime.now().strftime('%H:%M:%S')}")
         status = data.get('status', 'aguardando_dados')
@@ -292,17 +625,30 @@ class FusionMonitor:
         
         # Dados do Reator
         reactor_data = data.get('reactor', {})
-        self.update_reactor_display(reactor_data, current_time)
+        reactor_values = self.update_reactor_display(reactor_data, current_time,
+                                                     self.device_alerts(data, "reactor"))
         
         # Dados da Turbina
         turbine_data = data.get('turbine', {})
-        self.update_turbine_display(turbine_data, current_time)
+        production_j = self.update_turbine_display(turbine_data, current_time,
+                                                   self.device_alerts(data, "turbine"),
+                                                   self.device_derived(data, "turbine"))
+        trace.mark("interface")
+        
+        # Adicionar dados históricos (NaN marca a série ausente nesta atualização)
+        if reactor_values is not None or production_j is not None:
+            plasma_temp, case_temp, injection_rate = reactor_values or (np.nan, np.nan, np.nan)
+            self.history.append((current_time, plasma_temp, case_temp, injection_rate,
+                                 np.nan if production_j is None else production_j))
+        trace.mark("historico")
         
         # Atualizar gráficos
         self.update_graphs(current_time)
+        trace.mark("graficos")
+        self.profiler.finish(trace)
         
-    def update_reactor_display(self, reactor_data, current_time):
-        """Atualiza a exibição dos dados do reator"""
+    def update_reactor_display(self, reactor_data, current_time, alerts=None):
+        """Atualiza a exibição dos dados do reator e retorna (plasma, casco, injeção)"""
         if reactor_data:
             # Temperaturas (já em Celsius)
             plasma_temp = reactor_data.get('plasma_temperature', 0)
@@ -315,8 +661,14 @@ class FusionMonitor:
             injection_rate = reactor_data.get('injection_rate', 0)
             self.injection_var.set(f"{injection_rate:,.0f}")
             
-            # Status do reator
-            if plasma_temp > 1e8:
+            # Status do reator: alertas preditivos do servidor ou, sem eles, os limites fixos
+            if alerts:
+                status_text = self.alert_text(alerts)
+                status_color = 'orange'
+            elif alerts is not None:
+                status_text = "✅ Reator operando normalmente"
+                status_color = '#00ff88'
+            elif plasma_temp > 1e8:
                 status_text = "⚠️  ALERTA: Temperatura crítica!"
                 status_color = '#ff4444'
             elif plasma_temp > 5e7:
@@ -329,45 +681,45 @@ class FusionMonitor:
             self.reactor_status_var.set(status_text)
             # Não é possível alterar cor do texto dinamicamente no ttk, então usamos foreground fixo
             
-            # Adicionar dados históricos
-            self.time_data.append(current_time)
-            self.plasma_temp_data.append(plasma_temp)
-            self.case_temp_data.append(case_temp)
-            self.injection_rate_data.append(injection_rate)
-            
-            # Limitar histórico
-            if len(self.time_data) > self.max_history:
-                self.time_data.pop(0)
-                self.plasma_temp_data.pop(0)
-                self.case_temp_data.pop(0)
-                self.injection_rate_data.pop(0)
-        
-    def update_turbine_display(self, turbine_data, current_time):
-        """Atualiza a exibição dos dados da turbina"""
+            return plasma_temp, case_temp, injection_rate
+        return None
+        
+    def update_turbine_display(self, turbine_data, current_time, alerts=None, derived=None):
+        """Atualiza a exibição dos dados da turbina e retorna a produção em J/t"""
         if turbine_data:
-            # Converter RF/t para J/t (1 RF = 10 J no contexto do mod)
-            production_rf = turbine_data.get('production_rate', 0)
-            max_production_rf = turbine_data.get('max_production', 0)
-            
-            production_j = production_rf * 10  # Conversão para Joules
-            max_production_j = max_production_rf * 10  # Conversão para Joules
+            derived = derived or {}
+            if 'eficiencia_pct' in derived:
+                # Já convertidos pelo servidor (derived_metrics)
+                production_j = derived['producao_j']
+                max_production_j = derived['producao_max_j']
+                efficiency = derived['eficiencia_pct']
+            else:
+                # Converter RF/t para J/t (1 RF = 10 J no contexto do mod)
+                production_rf = turbine_data.get('production_rate', 0)
+                max_production_rf = turbine_data.get('max_production', 0)
+                
+                production_j = production_rf * 10  # Conversão para Joules
+                max_production_j = max_production_rf * 10  # Conversão para Joules
+                
+                # Eficiência
+                if max_production_j > 0:
+                    efficiency = (production_j / max_production_j) * 100
+                else:
+                    efficiency = 0.0
             
             self.production_var.set(f"{production_j:,.0f}")
             self.max_production_var.set(f"{max_production_j:,.0f}")
-            
-            # Eficiência
-            if max_production_j > 0:
-                efficiency = (production_j / max_production_j) * 100
-                self.efficiency_var.set(f"{efficiency:.1f}")
-            else:
-                self.efficiency_var.set("0.0")
+            self.efficiency_var.set(f"{efficiency:.1f}")
             
             # Vazão (mB/tick - mantém unidade do Minecraft)
             flow_rate = turbine_data.get('flow_rate', 0)
             self.flow_var.set(f"{flow_rate:,.0f}")
             
             # Status da turbina
-            if efficiency >= 90:
+            if alerts:
+                status_text = self.alert_text(alerts)
+                status_color = 'orange'
+            elif efficiency >= 90:
                 status_text = "✅ Turbina em capacidade máxima"
                 status_color = '#00ff88'
             elif efficiency >= 50:
@@ -379,24 +731,40 @@ class FusionMonitor:
             
             self.turbine_status_var.set(status_text)
             
-            # Adicionar dados históricos de energia
-            self.energy_production_data.append(production_j)
-            if len(self.energy_production_data) > self.max_history:
-                self.energy_production_data.pop(0)
+            return production_j
+        return None
+        
+    def alert_text(self, alerts):
+        """Primeiro alerta (sem o prefixo do dispositivo) e quantos outros há"""
+        text = "⚠️  " + alerts[0].split(": ", 1)[-1]
+        if len(alerts) > 1:
+            text += f" (+{len(alerts) - 1})"
+        return text
         
     def update_graphs(self, current_time):
         """Atualiza os gráficos"""
-        if len(self.time_data) > 0:
+        if not self.charts_ready:
+            # O histórico continua no buffer e é desenhado quando os gráficos ficarem prontos
+            return
+        if self.render_mode == "blit":
+            # O quadro é desenhado pelo render_tick
+            self.graphs_dirty = True
+            return
+        
+        if len(self.history) > 0:
+            # Visões sem cópia sobre o buffer circular
+            time_data = self.history.view("time")
+            
             # Atualizar gráfico de temperaturas
-            self.plasma_line.set_data(self.time_data, self.plasma_temp_data)
-            self.case_line.set_data(self.time_data, self.case_temp_data)
+            self.plasma_line.set_data(time_data, self.history.view("plasma_temperature"))
+            self.case_line.set_data(time_data, self.history.view("case_temperature"))
             
             self.temp_ax.relim()
             self.temp_ax.autoscale_view()
             self.temp_canvas.draw()
             
             # Atualizar gráfico de energia
-            self.energy_line.set_data(self.time_data, self.energy_production_data)
+            self.energy_line.set_data(time_data, self.history.view("energy_production"))
             
             self.energy_ax.relim()
             self.energy_ax.autoscale_view()
@@ -405,18 +773,50 @@ class FusionMonitor:
     def on_closing(self):
         """Executado quando a janela é fechada"""
         self.running = False
+        self.profiler.close()
         self.root.destroy()
 
 def main():
+    parser = argparse.ArgumentParser(description="Fusion Reactor Monitor")
+    parser.add_argument("--servidor", metavar="URL",
+                        help="recebe dados ao vivo do servidor (ex.: ws://localhost:8765) em vez de ler fusion_data.json")
+    parser.add_argument("--pontos", type=int, default=100, metavar="N",
+                        help="pontos máximos de histórico nos gráficos (padrão: 100)")
+    parser.add_argument("--render", choices=("completo", "blit"), default="completo",
+                        help="modo de renderização dos gráficos (padrão: completo)")
+    parser.add_argument("--fps", type=float, default=20, metavar="N",
+                        help="taxa máxima de quadros no modo blit (padrão: 20)")
+    parser.add_argument("--dispositivo", metavar="ID",
+                        help="id do reator/turbina a exibir (padrão: dispositivo principal)")
+    parser.add_argument("--replay", metavar="DIR",
+                        help="abre o histórico gravado pelo servidor (ex.: fusion_history) em modo replay")
+    parser.add_argument("--lod", choices=("minmax", "lttb"), default="minmax",
+                        help="redução de pontos no replay (padrão: minmax)")
+    parser.add_argument("--perfil", action="store_true",
+                        help="mede o tempo de cada etapa das atualizações e mostra um quadro sobreposto")
+    parser.add_argument("--perfil-trace", metavar="ARQUIVO",
+                        help="grava as etapas num arquivo de trace do Chrome (chrome://tracing, Perfetto); liga o perfil")
+    args = parser.parse_args()
+    
     root = tk.Tk()
-    app = FusionMonitor(root)
+    profiler = StageProfiler(enabled=args.perfil, trace_path=args.perfil_trace)
+    app = FusionMonitor(root, server_url=args.servidor, max_history=args.pontos,
+                        render_mode=args.render, target_fps=args.fps, device_id=args.dispositivo,
+                        replay_path=args.replay, replay_method=args.lod, profiler=profiler)
     
     # Configurar fechamento seguro
     root.protocol("WM_DELETE_WINDOW", app.on_closing)
     
     print("🚀 Fusion Monitor Avançado iniciado!")
-    print("📊 Monitorando fusion_data.json em tempo real...")
+    if args.replay:
+        print(f"⏪ Replay do histórico em {args.replay}")
+    elif args.servidor:
+        print(f"📡 Recebendo dados ao vivo de {args.servidor}...")
+    else:
+        print("📊 Monitorando fusion_data.json em tempo real...")
     print("📈 Gráficos ativos - Interface dark mode")
+    if profiler.enabled:
+        print("⏱️  Perfil por etapa ativo" + (f" (trace em {args.perfil_trace})" if args.perfil_trace else ""))
     print("-" * 50)
     
     root.mainloop()
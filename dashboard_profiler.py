@@ -0,0 +1,128 @@
+# dashboard_profiler.py
+# Modo --perfil do dashboard: cada atualização carrega um UpdateTrace que marca o fim de cada
+# etapa (leitura, json, fila do Tk, interface, gráficos...), mesmo passando de uma thread para outra.
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+class UpdateTrace:
+    """Etapas de uma atualização: (nome, início, fim, thread) em segundos do perf_counter"""
+    __slots__ = ("name", "started", "last", "stages")
+
+    def __init__(self, name):
+        self.name = name
+        self.started = self.last = time.perf_counter()
+        self.stages = []
+
+    def mark(self, stage):
+        """Fecha a etapa que começou na marca anterior"""
+        now = time.perf_counter()
+        self.stages.append((stage, self.last, now, threading.current_thread().name))
+        self.last = now
+
+
+class _NoTrace:
+    """Usado com o perfil desligado: marcar não custa nada além da chamada"""
+    __slots__ = ()
+
+    def mark(self, stage):
+        pass
+
+
+NO_TRACE = _NoTrace()
+
+
+class StageProfiler:
+    """Tempo por etapa das últimas atualizações e, opcionalmente, arquivo de trace.
+
+    O trace usa o formato de eventos do Chrome (abre no chrome://tracing ou no Perfetto).
+    """
+
+    def __init__(self, enabled=False, trace_path=None, window=200):
+        self.enabled = enabled or trace_path is not None
+        self.window = window
+        self.frames = {}  # nome da atualização -> deque de (duração total, {etapa: duração})
+        self.stage_order = {}  # nome da atualização -> etapas na ordem em que aparecem
+        self._lock = threading.Lock()
+        self._trace_file = None
+        self._origin = time.perf_counter()
+        if trace_path is not None:
+            self._trace_file = open(trace_path, "w")
+            self._trace_file.write('{"traceEvents": [\n')
+            self._trace_first = True
+            self._trace_event({"name": "process_name", "ph": "M", "pid": os.getpid(),
+                               "args": {"name": "dashBoard"}})
+
+    def begin(self, name="atualizacao"):
+        return UpdateTrace(name) if self.enabled else NO_TRACE
+
+    def finish(self, trace):
+        """Registra a atualização; chamar na thread do Tk depois da última etapa"""
+        if trace is NO_TRACE or not trace.stages:
+            return
+        durations = {}
+        for stage, start, end, _ in trace.stages:
+            durations[stage] = durations.get(stage, 0.0) + end - start
+        with self._lock:
+            frames = self.frames.get(trace.name)
+            if frames is None:
+                frames = self.frames[trace.name] = deque(maxlen=self.window)
+                self.stage_order[trace.name] = []
+            frames.append((trace.last - trace.started, durations))
+            order = self.stage_order[trace.name]
+            order.extend(stage for stage in durations if stage not in order)
+
+        if self._trace_file is not None:
+            pid = os.getpid()
+            self._trace_event({"name": trace.name, "ph": "X", "pid": pid, "tid": "atualizacoes",
+                               "ts": self._us(trace.started), "dur": self._us(trace.last) - self._us(trace.started)})
+            for stage, start, end, thread in trace.stages:
+                self._trace_event({"name": stage, "cat": trace.name, "ph": "X", "pid": pid, "tid": thread,
+                                   "ts": self._us(start), "dur": self._us(end) - self._us(start)})
+
+    def summary(self):
+        """Por atualização: quantidade, média/p95 do total (ms), taxa e média de cada etapa (ms)"""
+        with self._lock:
+            snapshot = {name: (list(frames), list(self.stage_order[name])) for name, frames in self.frames.items()}
+        result = {}
+        for name, (frames, order) in snapshot.items():
+            totals = sorted(total for total, _ in frames)
+            result[name] = {
+                "quantidade": len(frames),
+                "media_ms": 1000 * sum(totals) / len(totals),
+                "p95_ms": 1000 * totals[min(len(totals) - 1, int(0.95 * len(totals)))],
+                "etapas_ms": {stage: 1000 * sum(d.get(stage, 0.0) for _, d in frames) / len(frames)
+                              for stage in order},
+            }
+        return result
+
+    def overlay_text(self):
+        """Texto do painel sobreposto ao dashboard"""
+        lines = []
+        for name, stats in self.summary().items():
+            lines.append(f"{name}: {stats['media_ms']:.1f} ms (p95 {stats['p95_ms']:.1f}) "
+                         f"· {stats['quantidade']} amostras")
+            lines.extend(f"  {stage:<10} {ms:7.2f} ms" for stage, ms in stats["etapas_ms"].items())
+        return "\n".join(lines) or "Perfil: aguardando atualizações..."
+
+    def close(self):
+        if self._trace_file is not None:
+            with self._lock:
+                self._trace_file.write("\n]}\n")
+                self._trace_file.close()
+                self._trace_file = None
+
+    def _us(self, t):
+        return round(1e6 * (t - self._origin))
+
+    def _trace_event(self, event):
+        with self._lock:
+            if self._trace_file is None:
+                return
+            if not self._trace_first:
+                self._trace_file.write(",\n")
+            self._trace_first = False
+            self._trace_file.write(json.dumps(event))
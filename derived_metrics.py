@@ -0,0 +1,97 @@
+# derived_metrics.py
+# Métricas derivadas calculadas uma vez por amostra na ingestão; dashboards, painel web,
+# snapshot e clientes recebem os valores prontos em "derivados".
+
+RF_TO_J = 10  # 1 RF = 10 J no contexto do mod
+
+# Nível -> capacidade (também geram as séries de ocupação {nível}_fill da análise)
+LEVEL_FIELDS = (
+    ("deuterium", "deuterium_capacity"),
+    ("water", "water_capacity"),
+    ("steam", "steam_capacity"),
+    ("energy", "max_energy"),
+)
+
+
+def tank_summary(derived):
+    """Bloco "tanques" do solicitar_analise: ocupação, variação e tempo até esvaziar lidos de compute()"""
+    return {level_field: {
+        "ocupacao": derived[f"{level_field}_ocupacao"],
+        "taxa": derived.get(f"{level_field}_variacao"),
+        "esvazia_s": derived.get(f"{level_field}_esvazia_s"),
+    } for level_field, _ in LEVEL_FIELDS if f"{level_field}_ocupacao" in derived}
+
+
+class DerivedMetrics:
+    """Conversões, eficiência, ocupação dos tanques, variação, consumo e tempo até esvaziar/encher.
+
+    A variação de cada nível é uma média móvel exponencial da diferença entre amostras
+    consecutivas; só o último nível de cada dispositivo fica guardado.
+    """
+
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self._previous = {}  # (tipo, id) -> (t, {campo: ocupação})
+        self._rates = {}     # (tipo, id, campo) -> variação da ocupação (fração por segundo)
+
+    def checkpoint_state(self):
+        """Último nível e taxa de cada dispositivo, em listas (serializáveis em JSON)"""
+        return {
+            "previous": [[kind, device_id, t, fills] for (kind, device_id), (t, fills) in self._previous.items()],
+            "rates": [[*key, rate] for key, rate in self._rates.items()],
+        }
+
+    def restore_state(self, state):
+        self._previous = {(kind, device_id): (t, fills) for kind, device_id, t, fills in state["previous"]}
+        self._rates = {(kind, device_id, field): rate for kind, device_id, field, rate in state["rates"]}
+
+    def compute(self, kind, device_id, t, values):
+        """values: {campo: float} da amostra, já com as tabelas resolvidas (sample_codec.validate)"""
+        derived = {}
+
+        production = values.get("production_rate")
+        if production is not None:
+            derived["producao_j"] = production * RF_TO_J
+            max_production = values.get("max_production")
+            if max_production is not None:
+                derived["producao_max_j"] = max_production * RF_TO_J
+                derived["eficiencia_pct"] = 100 * production / max_production if max_production > 0 else 0.0
+
+        flow = values.get("flow_rate")
+        max_flow = values.get("max_flow_rate")
+        if flow is not None and max_flow:
+            derived["vazao_pct"] = 100 * flow / max_flow
+
+        key = (kind, device_id)
+        previous_t, previous_fill = self._previous.get(key, (None, {}))
+        fills = {}
+        for level_field, capacity_field in LEVEL_FIELDS:
+            level = values.get(level_field)
+            capacity = values.get(capacity_field)
+            if level is None or not capacity:
+                continue
+            fill = level / capacity
+            fills[level_field] = fill
+            derived[f"{level_field}_ocupacao"] = fill
+
+            rate_key = (kind, device_id, level_field)
+            rate = self._rates.get(rate_key)
+            if level_field in previous_fill and t > previous_t:
+                instant = (fill - previous_fill[level_field]) / (t - previous_t)
+                rate = instant if rate is None else rate + self.alpha * (instant - rate)
+                self._rates[rate_key] = rate
+            if rate is None:
+                continue
+
+            derived[f"{level_field}_variacao"] = rate
+            if rate < 0:
+                derived[f"{level_field}_esvazia_s"] = fill / -rate
+            elif rate > 0:
+                derived[f"{level_field}_enche_s"] = (1.0 - fill) / rate
+            if level_field == "deuterium":
+                # Consumo de combustível na unidade do tanque (mB/s)
+                derived["consumo_combustivel"] = max(0.0, -rate * capacity)
+
+        if fills:
+            self._previous[key] = (t, fills)
+        return derived
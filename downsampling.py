@@ -0,0 +1,65 @@
+# downsampling.py
+import numpy as np
+
+
+def minmax(x, y, n_buckets):
+    """Mantém o mínimo e o máximo de cada bucket (preserva picos); até 2 pontos por bucket"""
+    n = len(x)
+    if n <= 2 * n_buckets or n_buckets < 1:
+        return x, y
+
+    # Buckets de mesmo número de pontos; a sobra vai para o último
+    size = n // n_buckets
+    body = size * n_buckets
+    blocks = y[:body].reshape(n_buckets, size)
+    offsets = np.arange(n_buckets) * size
+    lo = blocks.argmin(axis=1) + offsets
+    hi = blocks.argmax(axis=1) + offsets
+
+    indices = [lo, hi]
+    if body < n:
+        tail = y[body:]
+        indices.append(np.array([body + tail.argmin(), body + tail.argmax()]))
+    indices = np.unique(np.concatenate(indices))  # Ordena e remove repetidos
+    return x[indices], y[indices]
+
+
+def lttb(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: escolhe o ponto que mais preserva a forma em cada bucket"""
+    n = len(x)
+    if n <= n_out or n_out < 3:
+        return x, y
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        if end <= start:
+            end = start + 1
+        # Média do próximo bucket como terceiro vértice
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        if next_end <= next_start:
+            next_end = next_start + 1
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        px, py = x[previous], y[previous]
+        area = np.abs((px - avg_x) * (y[start:end] - py) - (px - x[start:end]) * (avg_y - py))
+        previous = start + int(area.argmax())
+        selected[i + 1] = previous
+
+    return x[selected], y[selected]
+
+
+METHODS = {"minmax": minmax, "lttb": lttb}
+
+
+def downsample(x, y, max_points, method="minmax"):
+    """Reduz a série para cerca de `max_points` pontos (um por pixel)"""
+    if method == "minmax":
+        return minmax(x, y, max(1, max_points // 2))
+    return METHODS[method](x, y, max_points)
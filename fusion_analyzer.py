@@ -1,159 +1,877 @@
 # fusion_server.py
 import asyncio
 import websockets
+import argparse
 import json
+import logging
 import time
 from datetime import datetime
 import os
+from client_connection import ClientConnection, OVERFLOW_POLICIES
+from derived_metrics import DerivedMetrics, tank_summary
+from history_query import HistoryQueryError, query_history, query_params
+from metrics import MetricsRegistry, SampledLogger, monitor_event_loop_lag, serve_metrics
+from process_workers import WorkerHistoryStore, WorkerPool
+from sample_codec import MAX_ID_BYTES, SampleError, dumps, loads, normalize_id, validate
+from server_checkpoint import CheckpointError, gc_paused, load_checkpoint, save_checkpoint
+from shared_ring import DEFAULT_CAPACITY, SharedSampleRing
+from timeseries_store import TimeSeriesStore
+from streaming_analysis import AnalysisEngine
+from web_dashboard import WebDashboard
+from wire_format import DeltaDecoder, KeyframeRequired, FRAME_KINDS, FRAME_TYPES, negotiation_reply
+
+logger = logging.getLogger("fusion")
+
+class SnapshotWriter:
+    """Grava o snapshot em disco em segundo plano, no máximo uma vez por intervalo"""
+    
+    def __init__(self, path, build_snapshot, interval=1.0, write_time=None):
+        self.path = path
+        self.build_snapshot = build_snapshot
+        self.interval = interval
+        self.write_time = write_time  # Histograma opcional do tempo de escrita
+        self.writes = 0
+        self._dirty = asyncio.Event()
+        self._task = None
+        self._writing = None  # Escrita em andamento na thread (sobrevive ao cancelamento da tarefa)
+    
+    def mark_dirty(self):
+        """Sinaliza que há dados novos; rajadas de mensagens viram uma única escrita"""
+        self._dirty.set()
+    
+    def write_now(self, data):
+        """Escrita síncrona (usada antes do event loop iniciar)"""
+        self._write_atomic(data)
+    
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Para a tarefa e grava o último estado pendente"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._writing is not None:
+            # A thread continua depois do cancelamento; a escrita final não pode disputar o .tmp com ela
+            try:
+                await self._writing
+            except Exception as e:
+                logger.error("Erro ao atualizar JSON: %s", e)
+            self._writing = None
+        if self._dirty.is_set():
+            self._dirty.clear()
+            await asyncio.to_thread(self._write_atomic, self.build_snapshot())
+    
+    async def _run(self):
+        while True:
+            await self._dirty.wait()
+            self._dirty.clear()
+            
+            try:
+                # Serialização e I/O rodam fora do event loop
+                self._writing = asyncio.ensure_future(asyncio.to_thread(self._write_atomic, self.build_snapshot()))
+                await asyncio.shield(self._writing)
+                self._writing = None
+                self.writes += 1
+            except Exception as e:
+                self._writing = None
+                logger.error("Erro ao atualizar JSON: %s", e)
+            
+            await asyncio.sleep(self.interval)
+    
+    def _write_atomic(self, data):
+        # Escreve em arquivo temporário e renomeia: leitores nunca veem arquivo pela metade
+        started = time.perf_counter()
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(dumps(data))
+        os.replace(tmp_path, self.path)
+        if self.write_time is not None:
+            self.write_time.observe(time.perf_counter() - started)
+
+DEFAULT_DEVICE_ID = "principal"  # Usado quando o cliente não anuncia um id
+
+# Tipos de mensagem que carregam amostras -> tipo de dispositivo
+SAMPLE_MESSAGE_TYPES = {"dados_reator": "reactor", "dados_turbina": "turbine"}
+
+# Tipos aceitos (rótulo das métricas; o resto conta como "desconhecido")
+KNOWN_MESSAGE_TYPES = {"dados_reator", "dados_turbina", "lote", "k", "d", "negociar", "solicitar_dados_brutos",
+                       "solicitar_analise", "consultar_historico", "assinar", "painel", "ping"}
+
+def snapshot_document(reactors, turbines, analise=None, derivados=None):
+    """Conteúdo do fusion_data.json a partir dos dados atuais por id (derivados: chave -> métricas)"""
+    def primary(devices):
+        # Chaves legadas: dispositivo principal de cada tipo
+        if DEFAULT_DEVICE_ID in devices:
+            return devices[DEFAULT_DEVICE_ID]
+        return next(iter(devices.values()), {})
+    
+    document = {
+        "timestamp": datetime.now().isoformat(),
+        "reactor": primary(reactors),
+        "turbine": primary(turbines),
+        "reactors": reactors,
+        "turbines": turbines,
+    }
+    if derivados is not None:
+        document["derivados"] = derivados
+    if analise is not None:
+        document["analise"] = analise
+    document["status"] = "ativo" if reactors or turbines else "aguardando_dados"
+    return document
+
+class DeviceState:
+    """Último estado conhecido de um reator ou turbina"""
+    __slots__ = ("kind", "device_id", "data", "derived", "updated_at")
+    
+    def __init__(self, kind, device_id):
+        self.kind = kind
+        self.device_id = device_id
+        self.data = {}
+        self.derived = {}  # Métricas derivadas da última amostra (derived_metrics)
+        self.updated_at = 0.0
+    
+    @property
+    def key(self):
+        """Chave do dispositivo no histórico (ex.: "reactor:principal")"""
+        return f"{self.kind}:{self.device_id}"
 
 class FusionServer:
-    def __init__(self):
-        self.connected_clients = set()
-        self.reactor_data = {}
-        self.turbine_data = {}
+    def __init__(self, snapshot_interval=1.0, history_path="fusion_history", history_flush_interval=5.0,
+                 log_sample_every=100, send_queue_size=256, overflow_policy="descartar_antigas",
+                 alert_interval=1.0, web_tick=0.5, web_catchup=600, workers=False,
+                 ring_capacity=DEFAULT_CAPACITY, checkpoint_path="fusion_checkpoint.bin", checkpoint_interval=30.0):
+        self.connected_clients = {}  # websocket -> ClientConnection (fila de saída própria)
+        self.send_queue_size = send_queue_size
+        self.overflow_policy = overflow_policy
+        self.subscribers = {}  # Dashboards inscritos -> conjunto de ids filtrados (None = todos)
+        # Estado por dispositivo: tipo ("reactor"/"turbine") -> id anunciado -> DeviceState
+        self.devices = {"reactor": {}, "turbine": {}}
         self.json_file_path = "fusion_data.json"
         
+        # Instrumentação (exposta em /metrics) e log amostrado das mensagens repetitivas
+        self.metrics = MetricsRegistry()
+        self.messages_total = self.metrics.counter(
+            "fusion_mensagens_total", "Mensagens recebidas por tipo", labels=("tipo",))
+        self.errors_total = self.metrics.counter(
+            "fusion_erros_total", "Mensagens rejeitadas ou com erro de processamento", labels=("motivo",))
+        self.decode_time = self.metrics.histogram(
+            "fusion_decodificacao_segundos", "Tempo de decodificação do JSON por mensagem")
+        self.rejected_fields = self.metrics.counter(
+            "fusion_campos_rejeitados_total", "Campos de amostra fora do esquema do dispositivo (valor não numérico)",
+            labels=("campo",))
+        self.ack_time = self.metrics.histogram(
+            "fusion_resposta_segundos", "Tempo entre receber a mensagem e enviar a resposta", labels=("tipo",))
+        self.snapshot_write_time = self.metrics.histogram(
+            "fusion_escrita_snapshot_segundos", "Tempo de escrita do fusion_data.json")
+        self.loop_lag = self.metrics.histogram(
+            "fusion_lag_loop_segundos", "Atraso do event loop")
+        self.metrics.gauge("fusion_clientes_conectados", "Clientes WebSocket conectados",
+                           lambda: len(self.connected_clients))
+        self.queue_drops = self.metrics.counter(
+            "fusion_fila_descartes_total", "Mensagens de saída descartadas, coalescidas ou que causaram desconexão",
+            labels=("motivo",))
+        self.queue_wait = self.metrics.histogram(
+            "fusion_fila_espera_segundos", "Tempo de uma mensagem na fila de saída até ser enviada")
+        self.metrics.gauge("fusion_cliente_fila_mensagens", "Mensagens na fila de saída por cliente",
+                           lambda: {conn.name: conn.depth for conn in self.connected_clients.values()},
+                           labels=("cliente",))
+        self.metrics.gauge("fusion_cliente_atraso_segundos", "Espera da mensagem mais antiga na fila por cliente",
+                           lambda: {conn.name: conn.lag for conn in self.connected_clients.values()},
+                           labels=("cliente",))
+        self.metrics.gauge("fusion_dispositivos", "Reatores e turbinas conhecidos",
+                           lambda: len(self.devices["reactor"]) + len(self.devices["turbine"]))
+        self.log = SampledLogger(logger, log_sample_every)
+        self._lag_task = None
+        
+        self.snapshot_writer = SnapshotWriter(self.json_file_path, self.build_snapshot, snapshot_interval,
+                                              self.snapshot_write_time)
+        
+        # Histórico persistente (None desativa)
+        self.store = TimeSeriesStore(history_path) if history_path else None
+        self.history_flush_interval = history_flush_interval
+        self._history_task = None
+        
+        # Estatísticas incrementais para responder solicitar_analise
+        self.analysis = AnalysisEngine()
+        # Conversões, eficiência, ocupação e consumo: calculados uma vez por amostra
+        self.derived = DerivedMetrics()
+        
+        # Modo multiprocesso: histórico, análise e snapshot em processos que leem a memória compartilhada
+        self.ring = None
+        self.workers = None
+        if workers:
+            self.ring = SharedSampleRing.create(ring_capacity)
+            self.workers = WorkerPool(self.ring, history_path, self.json_file_path, snapshot_interval,
+                                      history_flush_interval, alert_interval,
+                                      checkpoint_interval if checkpoint_path else None)
+            self.analysis = self.workers.analysis  # Último relatório publicado pelo processo de análise
+            if history_path:
+                # Quem grava é o processo de histórico: os registros pendentes vêm dele
+                self.store = WorkerHistoryStore(history_path, self.workers)
+            self.metrics.gauge("fusion_buffer_compartilhado_amostras",
+                               "Amostras gravadas no buffer compartilhado", lambda: self.ring.write_seq)
+            self.metrics.gauge("fusion_processos_auxiliares_vivos", "Processos auxiliares rodando",
+                               self.workers.alive)
+        # Regras de alerta avaliadas em lote, para todos os dispositivos, a cada intervalo
+        self.alert_interval = alert_interval
+        self._alert_task = None
+        self._last_alerts = None
+        
+        # Formato compacto (keyframes + deltas) negociado pelos clientes
+        self.delta_decoder = DeltaDecoder()
+        # Último lote de cada cliente: id -> (sessão, seq); lotes reenviados após reconexão não duplicam amostras
+        self.last_batch = {}
+        
+        # Painel web: um quadro serializado por tick, compartilhado por todos os navegadores
+        self.web = WebDashboard(self, web_tick, web_catchup)
+        self.metrics.gauge("fusion_painel_espectadores", "Navegadores conectados ao painel web",
+                           lambda: len(self.web.viewers))
+        
+        # Checkpoint do estado em memória (None desativa): reinício sem perder últimos valores e análise
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_writes = self.metrics.counter(
+            "fusion_checkpoints_total", "Checkpoints do estado gravados")
+        self._checkpoint_task = None
+        self._checkpoint_dirty = False
+        self._restored_analysis = None  # Estado do engine para o processo de análise (modo multiprocesso)
+        self.restored_devices = self.restore_checkpoint() if checkpoint_path else 0
+        
         # Inicializa arquivo JSON
         self.initialize_json_file()
     
     def initialize_json_file(self):
-        """Inicializa o arquivo JSON com estrutura vazia"""
+        """Inicializa o arquivo JSON com estrutura vazia (com checkpoint restaurado, mantém o arquivo)"""
+        if self.restored_devices:
+            # O arquivo da execução anterior já tem os últimos valores; o escritor o regrava ao iniciar
+            self.snapshot_writer.mark_dirty()
+            return
         initial_data = {
             "timestamp": datetime.now().isoformat(),
             "reactor": {},
             "turbine": {},
             "status": "aguardando_dados"
         }
-        with open(self.json_file_path, 'w') as f:
-            json.dump(initial_data, f, indent=2)
+        self.snapshot_writer.write_now(initial_data)
     
-    async def update_json_file(self):
-        """Atualiza o arquivo JSON com os dados mais recentes"""
-        current_data = {
-            "timestamp": datetime.now().isoformat(),
-            "reactor": self.reactor_data.copy(),
-            "turbine": self.turbine_data.copy(),
-            "status": "ativo" if self.reactor_data or self.turbine_data else "aguardando_dados"
+    def checkpoint_state(self):
+        """Cópia (rasa) do estado em memória; os dicionários de dados são substituídos, nunca alterados"""
+        state = {
+            "created_at": time.time(),
+            "devices": [[state.kind, state.device_id, state.updated_at, state.data, state.derived]
+                        for states in self.devices.values() for state in states.values()],
+            "derived": self.derived.checkpoint_state(),
         }
+        if self.workers is None:
+            state["analysis"] = self.analysis.checkpoint_state()
+        else:
+            # A análise roda em outro processo: guarda o último estado e relatório que ele publicou
+            state["analysis"] = self.analysis.engine_state
+            state["report"] = self.analysis.latest
+        return state
+    
+    def restore_checkpoint(self):
+        """Restaura o checkpoint, se houver; retorna quantos dispositivos voltaram"""
+        started = time.perf_counter()
+        with gc_paused(freeze=True):
+            try:
+                state = load_checkpoint(self.checkpoint_path)
+            except CheckpointError as e:
+                logger.warning("Ignorando %s: %s", self.checkpoint_path, e)
+                return 0
+            if state is None:
+                return 0
+            self.apply_checkpoint(state)
+        
+        logger.info("Checkpoint restaurado: %d dispositivos em %.1f ms (gravado há %.0f s)",
+                    len(state["devices"]), 1000 * (time.perf_counter() - started),
+                    time.time() - state["created_at"])
+        return len(state["devices"])
+    
+    def apply_checkpoint(self, state):
+        for kind, device_id, updated_at, data, derived in state["devices"]:
+            device = self.devices[kind][device_id] = DeviceState(kind, device_id)
+            device.data = data
+            device.derived = derived
+            device.updated_at = updated_at
+        self.derived.restore_state(state["derived"])
+        if self.workers is None:
+            if state.get("analysis") is not None:
+                self.analysis.restore_state(state["analysis"])
+        else:
+            self.analysis.latest = state.get("report")
+            self.analysis.engine_state = self._restored_analysis = state.get("analysis")
+    
+    async def write_checkpoint(self):
+        """Captura o estado no event loop e serializa/grava em outra thread"""
+        self._checkpoint_dirty = False
+        with gc_paused():
+            state = self.checkpoint_state()
+        await asyncio.to_thread(save_checkpoint, self.checkpoint_path, state)
+        self.checkpoint_writes.inc()
+    
+    async def checkpoint_loop(self):
+        """Grava o checkpoint a cada intervalo, se chegou amostra nova"""
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            if not self._checkpoint_dirty:
+                continue
+            try:
+                await self.write_checkpoint()
+            except Exception as e:
+                logger.error("Erro ao gravar checkpoint: %s", e)
+    
+    def start(self):
+        """Inicia as tarefas de segundo plano (precisa de um event loop rodando)"""
+        if self.workers is not None:
+            self.workers.start([(state.kind, state.device_id, state.data, state.derived)
+                                for states in self.devices.values() for state in states.values()],
+                               self._restored_analysis)
+            self._restored_analysis = None
+        else:
+            self.snapshot_writer.start()
+            if self.store is not None and self._history_task is None:
+                self._history_task = asyncio.create_task(self.flush_history_loop())
+        if self._lag_task is None:
+            self._lag_task = asyncio.create_task(monitor_event_loop_lag(self.loop_lag))
+        if self._alert_task is None:
+            self._alert_task = asyncio.create_task(self.alert_loop())
+        if self.checkpoint_path and self._checkpoint_task is None:
+            self._checkpoint_task = asyncio.create_task(self.checkpoint_loop())
+        self.web.start()
+    
+    async def stop(self):
+        await self.snapshot_writer.stop()
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            self._lag_task = None
+        if self._alert_task is not None:
+            self._alert_task.cancel()
+            self._alert_task = None
+        self.web.stop()
+        if self._checkpoint_task is not None:
+            self._checkpoint_task.cancel()
+            self._checkpoint_task = None
+        if self.workers is not None:
+            # Os processos drenam o buffer e gravam o pendente antes de sair; a análise publica o
+            # estado final, que entra no último checkpoint
+            await asyncio.to_thread(self.workers.stop)
+            self.ring.close()
+        if self.checkpoint_path and self._checkpoint_dirty:
+            # Último estado: o próximo início retoma exatamente daqui
+            try:
+                await self.write_checkpoint()
+            except Exception as e:
+                logger.error("Erro ao gravar checkpoint: %s", e)
+        if self._history_task is not None:
+            self._history_task.cancel()
+            try:
+                await self._history_task
+            except asyncio.CancelledError:
+                pass
+            self._history_task = None
+        if self.workers is None and self.store is not None:
+            await asyncio.to_thread(self.store.flush, None, True)
+    
+    async def flush_history_loop(self):
+        """Grava periodicamente o histórico pendente, fora do event loop"""
+        while True:
+            await asyncio.sleep(self.history_flush_interval)
+            try:
+                await asyncio.to_thread(self.store.flush)
+            except Exception as e:
+                logger.error("Erro ao gravar histórico: %s", e)
+    
+    async def alert_loop(self):
+        """Reavalia as regras de alerta e avisa os dashboards inscritos quando algo muda"""
+        while True:
+            await asyncio.sleep(self.alert_interval)
+            if self.workers is None:
+                # Única avaliação das regras; solicitar_analise, snapshot e painel leem o resultado dela
+                self.analysis.evaluate()
+            else:
+                self.workers.check()
+            state = self.analysis.alert_state()
+            if state == self._last_alerts:
+                continue
+            self._last_alerts = state
+            
+            for websocket, device_ids in self.subscribers.items():
+                dados = state if device_ids is None else self.analysis.alert_state(device_ids)
+                self.send(websocket, {"tipo": "alertas", "dados": dados, "timestamp": time.time()}, "alertas")
+    
+    def with_tanks(self, report):
+        """Acrescenta os tanques de cada dispositivo do relatório (das métricas derivadas da última amostra)"""
+        devices = {}
+        for key, summary in report["dispositivos"].items():
+            kind, device_id = key.split(":", 1)
+            state = self.devices[kind].get(device_id)
+            devices[key] = {**summary, "tanques": tank_summary(state.derived) if state is not None else {}}
+        return {**report, "dispositivos": devices}
+    
+    def record_history(self, state, values):
+        """Registra os campos numéricos da amostra no histórico"""
+        if self.store is not None:
+            self.store.append_values(state.key, state.updated_at, values)
+    
+    def ingest_sample(self, kind, device_id, dados, timestamp=None):
+        """Atualiza o estado de um dispositivo com uma nova amostra (SampleError se os dados não servem)"""
+        dados, values, rejected = validate(kind, dados)
+        for field in rejected:
+            self.rejected_fields.labels(field).inc()
+        
+        states = self.devices[kind]
+        state = states.get(device_id)
+        if state is None:
+            # Recusa antes de criar o estado: um id que não cabe ficaria sem histórico/análise
+            if len(device_id.encode()) > MAX_ID_BYTES:
+                raise SampleError(f"id do dispositivo maior que {MAX_ID_BYTES} bytes")
+            if self.ring is not None and not self.ring.can_add(device_id):
+                raise SampleError("limite de dispositivos do buffer compartilhado atingido")
+            state = states[device_id] = DeviceState(kind, device_id)
+            logger.info("Novo dispositivo: %s", state.key)
+        
+        state.data = dados
+        state.updated_at = time.time() if timestamp is None else timestamp
+        state.derived = self.derived.compute(kind, device_id, state.updated_at, values)
+        self._checkpoint_dirty = True
         
-        # Remove timestamps internos para evitar duplicação
-        if "timestamp" in current_data["reactor"]:
-            del current_data["reactor"]["timestamp"]
-        if "timestamp" in current_data["turbine"]:
-            del current_data["turbine"]["timestamp"]
+        if self.ring is not None:
+            # Análise, JSON e histórico ficam com os processos auxiliares
+            self.ring.write(kind, device_id, state.updated_at, dados)
+        else:
+            self.analysis.update(kind, device_id, state.updated_at, values)
+            # Atualiza JSON e histórico
+            self.update_json_file()
+            self.record_history(state, values)
         
+        # Dashboards inscritos
+        self.broadcast_sample(state)
+        self.web.mark(state)
+        return state
+    
+    def ingest_frame(self, frame, default_id, timestamp=None):
+        """Aplica um keyframe/delta do formato compacto sobre o estado do dispositivo"""
+        kind, device_id, dados, seq = self.delta_decoder.decode(
+            frame, self.current_data(frame, default_id), default_id)
         try:
-            with open(self.json_file_path, 'w') as f:
-                json.dump(current_data, f, indent=2)
-            print(f"📄 JSON atualizado: {len(self.reactor_data)} dados reator, {len(self.turbine_data)} dados turbina")
-        except Exception as e:
-            print(f"❌ Erro ao atualizar JSON: {e}")
+            state = self.ingest_sample(kind, device_id, dados, timestamp)
+        except SampleError:
+            self.delta_decoder.reset(kind, device_id)
+            raise
+        self.delta_decoder.commit(kind, device_id, seq)
+        return state
+    
+    def current_data(self, frame, default_id):
+        """Dados atuais do dispositivo endereçado por um frame compacto (None se desconhecido)"""
+        state = self.devices[FRAME_KINDS[frame["d"]]].get(normalize_id(frame.get("i"), default_id))
+        return state.data if state else None
+    
+    def primary_device(self, kind):
+        """Dispositivo exibido nas chaves legadas "reactor"/"turbine" do snapshot"""
+        states = self.devices[kind]
+        state = states.get(DEFAULT_DEVICE_ID)
+        if state is None and states:
+            state = next(iter(states.values()))
+        return state
+    
+    def device_data(self, kind, device_ids=None):
+        """Dados atuais por id, opcionalmente filtrados"""
+        return {device_id: state.data for device_id, state in self.devices[kind].items()
+                if device_ids is None or device_id in device_ids}
+    
+    def derived_data(self, device_ids=None):
+        """Métricas derivadas por chave do dispositivo ("reactor:id"), opcionalmente filtradas"""
+        return {state.key: state.derived for states in self.devices.values() for state in states.values()
+                if device_ids is None or state.device_id in device_ids}
+    
+    def build_snapshot(self):
+        """Monta o estado atual (todos os reatores e turbinas) no formato do fusion_data.json"""
+        return snapshot_document(self.device_data("reactor"), self.device_data("turbine"),
+                                 self.analysis.alert_state(), self.derived_data())
+    
+    def update_json_file(self):
+        """Agenda a atualização do arquivo JSON com os dados mais recentes"""
+        self.snapshot_writer.mark_dirty()
+    
+    def broadcast_sample(self, state):
+        """Envia a nova amostra para os dashboards inscritos naquele dispositivo"""
+        if not self.subscribers:
+            return
+        
+        recipients = [ws for ws, device_ids in self.subscribers.items()
+                      if device_ids is None or state.device_id in device_ids]
+        if not recipients:
+            return
+        
+        # Serializa uma única vez; cada inscrito recebe pela própria fila (com "coalescer", só a última amostra por dispositivo)
+        payload = dumps({
+            "tipo": "amostra",
+            "dispositivo": state.kind,
+            "id": state.device_id,
+            "dados": state.data,
+            "derivados": state.derived,
+            "status": "ativo",
+            "timestamp": state.updated_at
+        })
+        key = ("amostra", state.kind, state.device_id)
+        for websocket in recipients:
+            conn = self.connected_clients.get(websocket)
+            if conn is not None:
+                conn.send(payload, key)
+    
+    def send(self, websocket, message, key=None):
+        """Enfileira uma mensagem para o cliente; nunca espera pelo envio"""
+        self.send_raw(websocket, dumps(message), key)
+    
+    def send_raw(self, websocket, payload, key=None):
+        """Enfileira uma mensagem já serializada (compartilhada entre vários clientes)"""
+        conn = self.connected_clients.get(websocket)
+        if conn is not None:
+            conn.send(payload, key)
+    
+    def request_keyframe(self, websocket, error):
+        """Pede ao cliente um keyframe para um dispositivo cuja base de deltas foi perdida"""
+        self.send(websocket, {
+            "tipo": "solicitar_chave",
+            "d": "r" if error.kind == "reactor" else "t",
+            "i": error.device_id
+        })
+    
+    async def history_query(self, data):
+        """Resposta do consultar_historico; "inicio"/"fim" <= 0 são relativos a agora (segundos)"""
+        if self.store is None:
+            return {"tipo": "erro", "mensagem": "Histórico desativado no servidor"}
+        
+        now = time.time()
+        kind = "turbine" if data.get("dispositivo") == "turbine" else "reactor"
+        
+        try:
+            device = f"{kind}:{normalize_id(data.get('id'), DEFAULT_DEVICE_ID)}"
+            start, end, bucket, fields = query_params(data, now)
+            result = await asyncio.to_thread(query_history, self.store, device, fields, start, end, bucket, now)
+        except HistoryQueryError as e:
+            return {"tipo": "erro", "mensagem": str(e)}
+        return {"tipo": "resultado_historico", "dados": result, "timestamp": now}
     
     async def handle_client(self, websocket):
         """Manipula conexões de clientes ComputerCraft"""
         client_ip = websocket.remote_address[0]
-        print(f"🎮 Cliente CC conectado: {client_ip}")
-        self.connected_clients.add(websocket)
+        self.log.info("conexao", "Cliente conectado: %s", client_ip)
+        
+        # Cada cliente tem fila de saída limitada e tarefa de envio própria
+        conn = ClientConnection(websocket, f"{client_ip}:{websocket.remote_address[1]}",
+                                self.send_queue_size, self.overflow_policy,
+                                on_drop=lambda reason: self.queue_drops.labels(reason).inc(),
+                                on_sent=self.queue_wait.observe)
+        self.connected_clients[websocket] = conn
+        conn.start()
         
         try:
             # Envia confirmação de conexão
-            await websocket.send(json.dumps({
+            self.send(websocket, {
                 "tipo": "conexao",
                 "mensagem": "Servidor Fusion conectado",
                 "timestamp": time.time()
-            }))
+            })
             
             # Processa mensagens do cliente
             async for message in websocket:
                 await self.process_message(websocket, message)
                 
         except websockets.exceptions.ConnectionClosed:
-            print(f"🔌 Cliente desconectado: {client_ip}")
+            self.log.info("desconexao", "Cliente desconectado: %s", client_ip)
         finally:
-            self.connected_clients.remove(websocket)
+            self.connected_clients.pop(websocket).close()
+            self.subscribers.pop(websocket, None)
+            self.web.remove_viewer(websocket)
     
     async def process_message(self, websocket, message):
         """Processa mensagens recebidas do CC"""
+        received_at = time.perf_counter()
         try:
-            data = json.loads(message)
+            data = loads(message)
+            self.decode_time.observe(time.perf_counter() - received_at)
             message_type = data.get("tipo")
+            metric_type = message_type if message_type in KNOWN_MESSAGE_TYPES else "desconhecido"
+            self.messages_total.labels(metric_type).inc()
             
             if message_type == "dados_reator":
-                # Armazena dados do reator
-                self.reactor_data = data.get("dados", {})
-                self.reactor_data["timestamp"] = datetime.now().isoformat()
-                
-                print(f"📊 Dados do reator recebidos: {len(self.reactor_data)} campos")
-                
-                # Atualiza JSON
-                await self.update_json_file()
+                # Armazena dados do reator (id anunciado pelo cliente)
+                state = self.ingest_sample("reactor", normalize_id(data.get("id"), DEFAULT_DEVICE_ID),
+                                           data.get("dados", {}))
+                self.log.info("dados_reator", "Dados do reator %s recebidos: %d campos",
+                              state.device_id, len(state.data))
                 
                 # Confirma recebimento
-                await websocket.send(json.dumps({
+                self.send(websocket, {
                     "tipo": "confirmacao",
                     "status": "dados_reator_recebidos",
                     "timestamp": time.time()
-                }))
+                })
                 
             elif message_type == "dados_turbina":
-                # Armazena dados da turbina
-                self.turbine_data = data.get("dados", {})
-                self.turbine_data["timestamp"] = datetime.now().isoformat()
-                
-                print(f"📈 Dados da turbina recebidos: {len(self.turbine_data)} campos")
-                
-                # Atualiza JSON
-                await self.update_json_file()
+                # Armazena dados da turbina (id anunciado pelo cliente)
+                state = self.ingest_sample("turbine", normalize_id(data.get("id"), DEFAULT_DEVICE_ID),
+                                           data.get("dados", {}))
+                self.log.info("dados_turbina", "Dados da turbina %s recebidos: %d campos",
+                              state.device_id, len(state.data))
                 
                 # Confirma recebimento
-                await websocket.send(json.dumps({
+                self.send(websocket, {
                     "tipo": "confirmacao", 
                     "status": "dados_turbina_recebidos",
                     "timestamp": time.time()
-                }))
+                })
+                
+            elif message_type == "lote":
+                # Várias amostras (possivelmente de vários ciclos) num único frame, uma confirmação só
+                batch_received_at = time.time()
+                batch_sent_at = data.get("timestamp")
+                default_id = normalize_id(data.get("id"), DEFAULT_DEVICE_ID)
+                count = 0
+                keyframes_needed = {}  # Um pedido de keyframe por dispositivo, mesmo com vários deltas perdidos
+                
+                seq, session = data.get("seq"), data.get("sessao")
+                amostras = data.get("amostras", [])
+                if not isinstance(amostras, list):
+                    amostras = ()
+                deduplicate = session is not None and isinstance(seq, (int, float))
+                if deduplicate:
+                    last_session, last_seq = self.last_batch.get(default_id, (None, None))
+                    if session == last_session and seq <= last_seq:
+                        amostras = ()  # Reenvio de um lote já processado: só confirma de novo
+                
+                for amostra in amostras:
+                    try:
+                        sample_type = amostra.get("tipo")
+                        kind = SAMPLE_MESSAGE_TYPES.get(sample_type)
+                        if kind is None and sample_type not in FRAME_TYPES:
+                            continue
+                        
+                        # Reconstrói o instante de coleta pela idade relativa ao envio (imune a relógio do CC adiantado/atrasado)
+                        sample_time = batch_received_at
+                        sampled_at = amostra.get("timestamp", amostra.get("ts"))
+                        if batch_sent_at is not None and sampled_at is not None:
+                            sample_time -= max(0.0, (batch_sent_at - sampled_at) / 1000)
+                        
+                        if kind is not None:
+                            self.ingest_sample(kind, normalize_id(amostra.get("id"), default_id),
+                                               amostra.get("dados", {}), sample_time)
+                        else:
+                            self.ingest_frame(amostra, default_id, sample_time)
+                    except KeyframeRequired as e:
+                        keyframes_needed.setdefault((e.kind, e.device_id), e)
+                        continue
+                    except (SampleError, AttributeError, KeyError, TypeError, ValueError) as e:
+                        # Entrada ruim (não é objeto, "d" desconhecido, id de campo inválido...) não derruba o lote
+                        self.errors_total.labels("amostra_invalida").inc()
+                        self.log.warning("amostra_invalida", "Amostra descartada do lote: %r", e)
+                        continue
+                    count += 1
+                
+                if deduplicate and amostras:
+                    # Só depois de processado: um lote interrompido por erro volta a ser aceito no reenvio
+                    self.last_batch[default_id] = (session, seq)
+                
+                self.log.info("lote", "Lote %s recebido: %d amostras", seq, count)
+                
+                # Confirmação cumulativa: o cliente pode descartar tudo até este seq
+                self.send(websocket, {
+                    "tipo": "confirmacao",
+                    "status": "lote_recebido",
+                    "seq": seq,
+                    "quantidade": count,
+                    "timestamp": time.time()
+                })
+                for e in keyframes_needed.values():
+                    self.request_keyframe(websocket, e)
+                
+            elif message_type in FRAME_TYPES:
+                # Frame compacto avulso (keyframe "k" ou delta "d")
+                try:
+                    self.ingest_frame(data, DEFAULT_DEVICE_ID)
+                except KeyframeRequired as e:
+                    self.request_keyframe(websocket, e)
+                else:
+                    self.send(websocket, {"tipo": "confirmacao", "s": data.get("s")})
+                
+            elif message_type == "negociar":
+                # Cliente pede o formato compacto; qualquer outro formato continua em JSON completo
+                if data.get("formato") == "delta":
+                    reply = negotiation_reply()
+                else:
+                    reply = {"tipo": "formato", "formato": "json"}
+                self.send(websocket, reply)
                 
             elif message_type == "solicitar_dados_brutos":
-                # Envia dados brutos para o cliente
+                # Envia dados brutos para o cliente, opcionalmente de um único dispositivo ("id")
+                device_id = normalize_id(data.get("id"), None)
+                if device_id is None:
+                    reactor = self.primary_device("reactor")
+                    turbine = self.primary_device("turbine")
+                    device_ids = None
+                else:
+                    reactor = self.devices["reactor"].get(device_id)
+                    turbine = self.devices["turbine"].get(device_id)
+                    device_ids = {device_id}
                 dados_brutos = {
-                    "reator": self.reactor_data,
-                    "turbina": self.turbine_data,
+                    "reator": reactor.data if reactor else {},
+                    "turbina": turbine.data if turbine else {},
+                    "reatores": self.device_data("reactor", device_ids),
+                    "turbinas": self.device_data("turbine", device_ids),
+                    "derivados": self.derived_data(device_ids),
                     "timestamp": datetime.now().isoformat()
                 }
-                await websocket.send(json.dumps({
+                self.send(websocket, {
                     "tipo": "dados_brutos",
                     "dados": dados_brutos,
                     "timestamp": time.time()
-                }))
+                })
+                
+            elif message_type == "solicitar_analise":
+                # Resposta montada a partir do estado já calculado na ingestão
+                self.send(websocket, {
+                    "tipo": "analise",
+                    "dados": self.with_tanks(self.analysis.report(normalize_id(data.get("id"), None))),
+                    "timestamp": time.time()
+                })
+                
+            elif message_type == "consultar_historico":
+                # Série agregada por bucket, lida das agregações gravadas (fora do event loop)
+                self.send(websocket, await self.history_query(data))
+                
+            elif message_type == "assinar":
+                # Dashboard passa a receber cada amostra assim que chega ("ids" filtra dispositivos)
+                device_ids = data.get("ids")
+                if device_ids is not None and not isinstance(device_ids, list):
+                    raise SampleError("ids deve ser uma lista")
+                self.subscribers[websocket] = ({normalize_id(i, DEFAULT_DEVICE_ID) for i in device_ids}
+                                               if device_ids else None)
+                logger.info("Dashboard inscrito: %s", websocket.remote_address[0])
+                
+                # Envia o estado atual para o dashboard não começar vazio
+                self.send(websocket, {
+                    "tipo": "snapshot",
+                    "dados": self.build_snapshot(),
+                    "timestamp": time.time()
+                })
+                
+            elif message_type == "painel":
+                # Navegador do painel web: histórico recente e depois um quadro por tick
+                await self.web.add_viewer(websocket)
+                logger.info("Painel web conectado: %s", websocket.remote_address[0])
                 
             elif message_type == "ping":
                 # Responde ping
-                await websocket.send(json.dumps({
+                self.send(websocket, {
                     "tipo": "pong",
                     "timestamp": data.get("timestamp")
-                }))
-                
+                })
+            
+            self.ack_time.labels(metric_type).observe(time.perf_counter() - received_at)
+            
+        except SampleError as e:
+            self.errors_total.labels("amostra_invalida").inc()
+            self.log.warning("amostra_invalida", "Amostra rejeitada: %s", e)
+            self.send(websocket, {
+                "tipo": "erro",
+                "mensagem": str(e)
+            })
         except json.JSONDecodeError:
-            print(f"📨 Mensagem não-JSON recebida: {message}")
-            await websocket.send(json.dumps({
+            self.errors_total.labels("json_invalido").inc()
+            self.log.warning("json_invalido", "Mensagem não-JSON recebida: %.200s", message)
+            self.send(websocket, {
                 "tipo": "erro",
                 "mensagem": "Formato JSON inválido"
-            }))
+            })
         except Exception as e:
-            print(f"❌ Erro ao processar mensagem: {e}")
+            self.errors_total.labels("processamento").inc()
+            self.log.warning("erro_processamento", "Erro ao processar mensagem: %s", e)
 
 async def main():
-    server = FusionServer()
+    parser = argparse.ArgumentParser(description="Servidor Fusion")
+    parser.add_argument("--intervalo-snapshot", type=float, default=1.0, metavar="SEG",
+                        help="intervalo mínimo entre gravações do fusion_data.json (padrão: 1.0)")
+    parser.add_argument("--historico", default="fusion_history", metavar="DIR",
+                        help="diretório do histórico de séries temporais (padrão: fusion_history)")
+    parser.add_argument("--sem-historico", action="store_true",
+                        help="não grava histórico em disco")
+    parser.add_argument("--fila-tamanho", type=int, default=256, metavar="N",
+                        help="mensagens máximas na fila de saída de cada cliente (padrão: 256)")
+    parser.add_argument("--fila-politica", choices=OVERFLOW_POLICIES, default="descartar_antigas",
+                        help="o que fazer quando a fila de um cliente enche (padrão: descartar_antigas)")
+    parser.add_argument("--metricas-porta", type=int, default=9108, metavar="PORTA",
+                        help="porta local do endpoint /metrics (0 desativa; padrão: 9108)")
+    parser.add_argument("--painel-intervalo", type=float, default=0.5, metavar="SEG",
+                        help="intervalo entre quadros enviados ao painel web (padrão: 0.5)")
+    parser.add_argument("--painel-historico", type=float, default=600, metavar="SEG",
+                        help="segundos de histórico enviados a quem abre o painel web (padrão: 600)")
+    parser.add_argument("--checkpoint", default="fusion_checkpoint.bin", metavar="ARQ",
+                        help="checkpoint do estado em memória, restaurado na partida (padrão: fusion_checkpoint.bin)")
+    parser.add_argument("--intervalo-checkpoint", type=float, default=30.0, metavar="SEG",
+                        help="intervalo entre gravações do checkpoint (padrão: 30)")
+    parser.add_argument("--sem-checkpoint", action="store_true",
+                        help="não grava nem restaura o checkpoint")
+    parser.add_argument("--processos", action="store_true",
+                        help="histórico, análise e snapshot em processos separados (memória compartilhada)")
+    parser.add_argument("--log-nivel", default="INFO", choices=("DEBUG", "INFO", "WARNING", "ERROR"),
+                        help="nível de log (padrão: INFO)")
+    parser.add_argument("--log-amostragem", type=int, default=100, metavar="N",
+                        help="registra 1 a cada N mensagens repetitivas (padrão: 100)")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=args.log_nivel, format="%(asctime)s %(levelname)s %(message)s")
+    # O websockets registra cada conexão em INFO; só interessa a partir de avisos
+    logging.getLogger("websockets").setLevel(max(logging.WARNING, logging.getLevelName(args.log_nivel)))
+    
+    server = FusionServer(snapshot_interval=args.intervalo_snapshot,
+                          history_path=None if args.sem_historico else args.historico,
+                          log_sample_every=args.log_amostragem,
+                          send_queue_size=args.fila_tamanho,
+                          overflow_policy=args.fila_politica,
+                          web_tick=args.painel_intervalo,
+                          web_catchup=args.painel_historico,
+                          workers=args.processos,
+                          checkpoint_path=None if args.sem_checkpoint else args.checkpoint,
+                          checkpoint_interval=args.intervalo_checkpoint)
     
     print("🚀 SERVIDOR FUSION INICIADO")
     print("📡 Aguardando conexões WebSocket na porta 8765")
     print("💾 Dados brutos salvos em: fusion_data.json")
+    if server.store is not None:
+        print(f"🗄️  Histórico gravado em: {server.store.root}")
+    if server.restored_devices:
+        print(f"♻️  Estado restaurado de {server.checkpoint_path}: {server.restored_devices} dispositivos")
+    print("📺 Dashboard ao vivo: python dashBoard.py --servidor ws://localhost:8765")
+    print("🌐 Painel web: http://localhost:8765/")
+    if args.metricas_porta:
+        print(f"📈 Métricas: http://127.0.0.1:{args.metricas_porta}/metrics")
+    if server.workers is not None:
+        print("🧵 Modo multiprocesso: histórico, análise e snapshot em processos próprios")
     print("💡 ComputerCraft deve conectar como cliente")
     print("-" * 50)
     
     # Inicia o servidor WebSocket
-    async with websockets.serve(server.handle_client, "0.0.0.0", 8765):
-        print("✅ Servidor WebSocket rodando!")
-        await asyncio.Future()  # Executa indefinidamente
+    server.start()
+    metrics_server = None
+    if args.metricas_porta:
+        metrics_server = await serve_metrics(server.metrics, "127.0.0.1", args.metricas_porta)
+    try:
+        async with websockets.serve(server.handle_client, "0.0.0.0", 8765,
+                                    process_request=server.web.process_request):
+            print("✅ Servidor WebSocket rodando!")
+            await asyncio.Future()  # Executa indefinidamente
+    finally:
+        if metrics_server is not None:
+            metrics_server.close()
+        await server.stop()
 
 if __name__ == "__main__":
     try:
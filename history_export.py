@@ -0,0 +1,213 @@
+# history_export.py
+# Exporta o histórico gravado pelo servidor (fusion_history) para CSV ou Parquet. A leitura anda em
+# blocos de tempo: a memória usada depende do tamanho do bloco, não do intervalo exportado.
+import argparse
+import csv
+import math
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from history_query import aggregate_arrays, pick_resolution, read_records
+from history_replay import RAW_DTYPE, ROLLUP_DTYPE, map_segment
+from timeseries_store import RESOLUTIONS, ROLLUP_LEVELS, TimeSeriesStore
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Opcional: só o formato Parquet precisa
+    pa = pq = None
+
+AGGREGATIONS = ("media", "min", "max", "ultimo")
+DEFAULT_CHUNK = 3600  # Segundos de histórico lidos por vez
+
+
+def parse_time(value, now):
+    """Epoch em segundos, relativo ao agora quando <= 0 (como no consultar_historico) ou data ISO"""
+    try:
+        seconds = float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+    return now + seconds if seconds <= 0 else seconds
+
+
+def recorded_span(store, device, fields, resolutions):
+    """Primeiro e último instante gravados dos campos em qualquer das resoluções (None se não há registros)"""
+    first = last = None
+    for resolution in resolutions:
+        dtype = RAW_DTYPE if resolution == "raw" else ROLLUP_DTYPE
+        for field in fields:
+            segments = [segment for segment in (map_segment(path, dtype)
+                                                for path in store.segment_paths(device, field, resolution))
+                        if segment is not None]
+            if not segments:
+                continue
+            first = min(first if first is not None else math.inf, float(segments[0]["t"][0]))
+            last = max(last if last is not None else -math.inf, float(segments[-1]["t"][-1]))
+            del segments
+    return first, last
+
+
+def chunk_edges(start, end, chunk):
+    """Divide [start, end) em blocos alinhados a múltiplos de chunk"""
+    edge = start
+    while edge < end:
+        following = min((math.floor(edge / chunk) + 1) * chunk, end)
+        yield edge, following
+        edge = following
+
+
+def export_blocks(store, devices, fields, start, end, bucket=None, aggregation="media",
+                  chunk=DEFAULT_CHUNK, now=None):
+    """Gera (dispositivo, instantes, {campo: valores}) bloco a bloco, com os campos alinhados.
+
+    Sem bucket saem as amostras brutas (NaN onde um campo não tem valor naquele instante); com
+    bucket, um valor por bucket (agregação escolhida) a partir das agregações gravadas. Os blocos
+    são múltiplos do bucket, então nenhum bucket fica dividido entre dois blocos.
+
+    A resolução é escolhida por bloco: num intervalo longo, o trecho antigo vem das agregações de
+    retenção maior (1m, 1h) e o recente das mais finas.
+    """
+    now = time.time() if now is None else now
+    resolutions = ("raw",)
+    if bucket:
+        chunk = max(1, round(chunk / bucket)) * bucket
+        resolutions += tuple(level for level in ROLLUP_LEVELS if bucket % RESOLUTIONS[level]["bucket"] == 0)
+
+    for device in devices:
+        first, last = recorded_span(store, device, fields, resolutions)
+        if first is None:
+            continue
+        # Só percorre o trecho com registros (o último pode estar no fim de um bucket agregado)
+        device_start = max(start, math.floor(first / chunk) * chunk)
+        device_end = min(end, last + (bucket or 0) + 1)
+
+        for block_start, block_end in chunk_edges(device_start, device_end, chunk):
+            resolution = pick_resolution(bucket, block_start, now) if bucket else "raw"
+            series = {}
+            for field in fields:
+                records = read_records(store, device, field, resolution, block_start, block_end)
+                if not len(records):
+                    continue
+                if bucket:
+                    aggregated = aggregate_arrays(records, bucket, resolution == "raw")
+                    series[field] = (aggregated["t"], aggregated[aggregation])
+                else:
+                    series[field] = (records["t"], records["v"])
+            if not series:
+                continue
+
+            times = np.unique(np.concatenate([t for t, _ in series.values()]))
+            columns = {}
+            for field in fields:
+                column = np.full(len(times), np.nan)
+                if field in series:
+                    t, values = series[field]
+                    column[np.searchsorted(times, t)] = values
+                columns[field] = column
+            yield device, times, columns
+
+
+class CsvWriter:
+    def __init__(self, path, fields):
+        self.file = open(path, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(["dispositivo", "t", *fields])
+        self.fields = fields
+
+    def write(self, device, times, columns):
+        # NaN (campo sem valor no instante) vira célula vazia
+        values = [[None if v != v else v for v in columns[field].tolist()] for field in self.fields]
+        self.writer.writerows([device, t, *row] for t, *row in zip(times.tolist(), *values))
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    """Um row group por bloco"""
+
+    def __init__(self, path, fields):
+        self.schema = pa.schema([("dispositivo", pa.string()), ("t", pa.float64()),
+                                 *((field, pa.float64()) for field in fields)])
+        self.writer = pq.ParquetWriter(path, self.schema)
+        self.fields = fields
+
+    def write(self, device, times, columns):
+        arrays = [pa.array([device] * len(times), pa.string()), pa.array(times)]
+        arrays.extend(pa.array(columns[field], from_pandas=True) for field in self.fields)  # NaN -> nulo
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+WRITERS = {"csv": CsvWriter, "parquet": ParquetWriter}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta o histórico gravado para CSV ou Parquet")
+    parser.add_argument("saida", help="arquivo de saída (.csv ou .parquet)")
+    parser.add_argument("--historico", default="fusion_history", help="diretório do histórico (padrão: fusion_history)")
+    parser.add_argument("--dispositivos", nargs="+", metavar="DISPOSITIVO",
+                        help="ex.: reactor:principal (padrão: todos)")
+    parser.add_argument("--campos", nargs="+", metavar="CAMPO", help="campos exportados (padrão: todos)")
+    parser.add_argument("--inicio", default="0",
+                        help="epoch, segundos relativos ao agora (<= 0) ou data ISO (padrão: tudo)")
+    parser.add_argument("--fim", default="0", help="mesmo formato do início (padrão: agora)")
+    parser.add_argument("--reamostrar", type=float, metavar="SEG",
+                        help="um valor por bucket de SEG segundos em vez das amostras brutas")
+    parser.add_argument("--agregacao", choices=AGGREGATIONS, default="media",
+                        help="valor de cada bucket ao reamostrar (padrão: media)")
+    parser.add_argument("--formato", choices=tuple(WRITERS), help="padrão: pela extensão da saída")
+    parser.add_argument("--bloco", type=float, default=DEFAULT_CHUNK,
+                        help=f"segundos de histórico lidos por vez (padrão: {DEFAULT_CHUNK})")
+    args = parser.parse_args()
+
+    fmt = args.formato or ("parquet" if args.saida.endswith(".parquet") else "csv")
+    if fmt == "parquet" and pa is None:
+        print("❌ Exportar em Parquet precisa do pyarrow (pip install pyarrow)")
+        return 2
+    if not os.path.isdir(args.historico):
+        print(f"❌ Histórico não encontrado: {args.historico}")
+        return 2
+    if args.bloco <= 0 or (args.reamostrar is not None and args.reamostrar <= 0):
+        print("❌ --bloco e --reamostrar devem ser positivos")
+        return 2
+
+    now = time.time()
+    try:
+        start = parse_time(args.inicio, now) if args.inicio != "0" else 0.0
+        end = parse_time(args.fim, now)
+    except ValueError as e:
+        print(f"❌ Data inválida: {e}")
+        return 2
+
+    store = TimeSeriesStore(args.historico)
+    devices = args.dispositivos or store.devices()
+    fields = args.campos or sorted({field for device in devices for field in store.fields(device)})
+    if not devices or not fields:
+        print("❌ Nada para exportar")
+        return 1
+
+    print(f"📦 Exportando {len(devices)} dispositivo(s), {len(fields)} campo(s) para {args.saida} ({fmt})...")
+    started = time.perf_counter()
+    rows = 0
+    writer = WRITERS[fmt](args.saida, fields)
+    try:
+        for device, times, columns in export_blocks(store, devices, fields, start, end, args.reamostrar,
+                                                    args.agregacao, args.bloco, now):
+            writer.write(device, times, columns)
+            rows += len(times)
+    finally:
+        writer.close()
+
+    print(f"✅ {rows} linhas em {time.perf_counter() - started:.1f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+# history_query.py
+import math
+
+import numpy as np
+
+from history_replay import RAW_DTYPE, ROLLUP_DTYPE, map_segment
+from timeseries_store import RESOLUTIONS, ROLLUP_LEVELS
+
+MAX_BUCKETS = 5000  # Por campo, em uma resposta
+
+
+class HistoryQueryError(ValueError):
+    """Consulta inválida (mensagem vai para o cliente)"""
+
+
+def pick_resolution(bucket, start, now):
+    """Resolução mais grossa cujo bucket divide o pedido e que ainda retém o início do intervalo"""
+    best = "raw"
+    for level in ROLLUP_LEVELS:
+        size = RESOLUTIONS[level]["bucket"]
+        retention = RESOLUTIONS[level]["retention"]
+        if size <= bucket and bucket % size == 0 and (retention is None or start >= now - retention):
+            best = level
+    return best
+
+
+def read_records(store, device, field, resolution, start, end):
+    """Registros em [start, end): segmentos mapeados em memória + pendentes, cortados por busca binária"""
+    dtype = RAW_DTYPE if resolution == "raw" else ROLLUP_DTYPE
+    parts = []
+    for path in store.segment_paths(device, field, resolution, start, end):
+        segment = map_segment(path, dtype)
+        if segment is None:
+            continue
+        times = segment["t"]
+        i0, i1 = np.searchsorted(times, (start, end), side="left")
+        if i1 > i0:
+            parts.append(np.array(segment[i0:i1]))  # Copia só a fatia; o mapeamento é liberado em seguida
+        del segment
+
+    tail = np.frombuffer(store.unflushed(device, field, resolution), dtype=dtype)
+    if len(tail):
+        parts.append(tail[(tail["t"] >= start) & (tail["t"] < end)])
+
+    if not parts:
+        return np.empty(0, dtype=dtype)
+    return np.concatenate(parts)
+
+
+def aggregate(records, bucket, raw):
+    """mín/máx/média/último por bucket (início alinhado a múltiplos do bucket), em listas"""
+    return {name: values.tolist() for name, values in aggregate_arrays(records, bucket, raw).items()}
+
+
+def aggregate_arrays(records, bucket, raw):
+    """Como aggregate(), em arrays NumPy"""
+    if len(records) == 0:
+        return {name: np.empty(0) for name in ("t", "min", "max", "media", "ultimo")}
+
+    times = records["t"]
+    if raw:
+        minimum = maximum = total = last = records["v"]
+        count = np.ones(len(records))
+    else:
+        minimum, maximum, total = records["min"], records["max"], records["sum"]
+        last, count = records["last"], records["count"].astype(np.float64)
+
+    index = np.floor(times / bucket)
+    boundaries = np.flatnonzero(np.diff(index)) + 1
+    starts = np.concatenate(([0], boundaries))
+    ends = np.concatenate((boundaries, [len(records)])) - 1
+    totals = np.add.reduceat(total, starts)
+    counts = np.add.reduceat(count, starts)
+    return {
+        "t": index[starts] * bucket,
+        "min": np.minimum.reduceat(minimum, starts),
+        "max": np.maximum.reduceat(maximum, starts),
+        "media": totals / counts,
+        "ultimo": last[ends],
+    }
+
+
+def query_params(data, now):
+    """Valida os parâmetros do consultar_historico: (inicio, fim, bucket, campos), com tempos <= 0 relativos a now"""
+    values = {}
+    for name, default in (("inicio", -3600), ("fim", now), ("bucket", 60)):
+        value = data.get(name, default)
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            raise HistoryQueryError(f"{name} deve ser um número")
+        values[name] = value
+    fields = data.get("campos")
+    if fields is not None and (not isinstance(fields, list) or not all(isinstance(f, str) for f in fields)):
+        raise HistoryQueryError("campos deve ser uma lista de nomes")
+    start, end = (now + values[name] if values[name] <= 0 else values[name] for name in ("inicio", "fim"))
+    return start, end, values["bucket"], fields
+
+
+def query_history(store, device, fields, start, end, bucket, now):
+    """Resposta do consultar_historico: séries agregadas por bucket a partir das agregações gravadas"""
+    if bucket <= 0:
+        raise HistoryQueryError("bucket deve ser positivo")
+    if end <= start:
+        raise HistoryQueryError("fim deve ser depois do início")
+    if (end - start) / bucket > MAX_BUCKETS:
+        raise HistoryQueryError(f"intervalo muito grande para o bucket (máximo de {MAX_BUCKETS} buckets)")
+
+    resolution = pick_resolution(bucket, start, now)
+    fields = fields or store.fields(device)
+    return {
+        "dispositivo": device,
+        "inicio": start,
+        "fim": end,
+        "bucket": bucket,
+        "resolucao": resolution,
+        "campos": {field: aggregate(read_records(store, device, field, resolution, start, end), bucket,
+                                    resolution == "raw")
+                   for field in fields},
+    }
@@ -0,0 +1,104 @@
+# history_replay.py
+import os
+
+import numpy as np
+
+from downsampling import downsample
+from timeseries_store import TimeSeriesStore, RAW_RECORD, ROLLUP_RECORD
+
+RAW_DTYPE = np.dtype([("t", "<f8"), ("v", "<f8")])
+ROLLUP_DTYPE = np.dtype([("t", "<f8"), ("min", "<f8"), ("max", "<f8"), ("sum", "<f8"), ("last", "<f8"),
+                         ("count", "<u8")])
+assert RAW_DTYPE.itemsize == RAW_RECORD.size and ROLLUP_DTYPE.itemsize == ROLLUP_RECORD.size
+
+# Acima disso a janela é lida das agregações (1m, depois 1h) em vez dos pontos brutos
+RAW_POINT_LIMIT = 500_000
+
+
+def map_segment(path, dtype):
+    """Mapeia um segmento em memória (sem ler o arquivo); ignora um registro parcial no fim"""
+    count = os.path.getsize(path) // dtype.itemsize
+    if count == 0:
+        return None
+    return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+
+
+class HistoryReplay:
+    """Leitura do histórico gravado pelo servidor para o modo replay do dashboard"""
+
+    def __init__(self, store_root, device, method="minmax"):
+        if not os.path.isdir(store_root):
+            raise FileNotFoundError(f"histórico não encontrado: {store_root}")
+        self.store = TimeSeriesStore(store_root)
+        self.device = device
+        self.method = method
+        self._segments = {}
+
+    def fields(self):
+        return self.store.fields(self.device)
+
+    def _mapped(self, field, resolution):
+        key = (field, resolution)
+        if key not in self._segments:
+            dtype = RAW_DTYPE if resolution == "raw" else ROLLUP_DTYPE
+            mapped = (map_segment(path, dtype) for path in self.store.segment_paths(self.device, field, resolution))
+            self._segments[key] = [m for m in mapped if m is not None]
+        return self._segments[key]
+
+    def time_range(self, fields):
+        """Primeiro e último instante gravados entre os campos (None se não há dados)"""
+        start, end = None, None
+        for field in fields:
+            for resolution in ("raw", "1m", "1h"):
+                segments = self._mapped(field, resolution)
+                if segments:
+                    first, last = float(segments[0]["t"][0]), float(segments[-1]["t"][-1])
+                    start = first if start is None else min(start, first)
+                    end = last if end is None else max(end, last)
+        return (start, end) if start is not None else None
+
+    def _slices(self, field, resolution, start, end):
+        """Fatias (visões do memmap) dentro de [start, end], localizadas por busca binária"""
+        slices = []
+        for segment in self._mapped(field, resolution):
+            times = segment["t"]
+            if times[-1] < start or times[0] > end:
+                continue
+            i0 = np.searchsorted(times, start, side="left")
+            i1 = np.searchsorted(times, end, side="right")
+            if i1 > i0:
+                slices.append(segment[i0:i1])
+        return slices
+
+    def window(self, field, start, end, max_points):
+        """(t, valores) da janela, reduzidos a ~max_points pontos com preservação de forma"""
+        raw = self._slices(field, "raw", start, end)
+        total = sum(len(s) for s in raw)
+        if raw and total <= RAW_POINT_LIMIT:
+            t = np.concatenate([s["t"] for s in raw])
+            v = np.concatenate([s["v"] for s in raw])
+            return downsample(t, v, max_points, self.method)
+
+        # Janela grande (ou brutos já expirados): usa o envelope mín/máx das agregações
+        for resolution in ("1m", "1h"):
+            rollups = self._slices(field, resolution, start, end)
+            if rollups and (sum(len(s) for s in rollups) <= RAW_POINT_LIMIT or resolution == "1h"):
+                records = np.concatenate(rollups)
+                t = np.repeat(records["t"], 2)
+                v = np.empty(len(t))
+                v[0::2] = records["min"]
+                v[1::2] = records["max"]
+                return downsample(t, v, max_points, self.method)
+
+        return np.empty(0), np.empty(0)
+
+    def value_at(self, field, t):
+        """Último valor gravado até o instante t (None se não há)"""
+        for resolution, column in (("raw", "v"), ("1m", "last"), ("1h", "last")):
+            for segment in reversed(self._mapped(field, resolution)):
+                times = segment["t"]
+                if times[0] > t:
+                    continue
+                i = np.searchsorted(times, t, side="right") - 1
+                return float(segment[column][i])
+        return None
@@ -0,0 +1,199 @@
+# metrics.py
+import asyncio
+import logging
+from bisect import bisect_left
+
+# Buckets (segundos) para latências de decodificação, escrita, ack e lag do loop
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    """Contador monotônico, opcionalmente separado por rótulos"""
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._children = {}
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = _Child(self, values)
+        return child
+
+    def inc(self, amount=1, _labels=()):
+        self._values[_labels] = self._values.get(_labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self._values.items():
+            yield self.name + _format_labels(self.label_names, labels), value
+
+
+class _Child:
+    __slots__ = ("metric", "values")
+
+    def __init__(self, metric, values):
+        self.metric = metric
+        self.values = tuple(values)
+
+    def inc(self, amount=1):
+        self.metric.inc(amount, self.values)
+
+    def observe(self, value):
+        self.metric.observe(value, self.values)
+
+
+class Gauge:
+    """Valor instantâneo; com callback, é lido só na hora da coleta.
+
+    Com rótulos, o callback devolve {valores dos rótulos: valor}.
+    """
+    kind = "gauge"
+
+    def __init__(self, name, help_text, callback=None, labels=()):
+        self.name = name
+        self.help = help_text
+        self.callback = callback
+        self.label_names = tuple(labels)
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self):
+        if self.label_names:
+            for labels, value in self.callback().items():
+                yield self.name + _format_labels(self.label_names, labels), value
+        else:
+            yield self.name, self.callback() if self.callback else self.value
+
+
+class Histogram:
+    """Histograma de buckets fixos: observar custa uma busca binária"""
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS, labels=()):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.label_names = tuple(labels)
+        self._series = {}  # rótulos -> [contagens por bucket (+Inf no fim), soma]
+        self._children = {}
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = _Child(self, values)
+        return child
+
+    def observe(self, value, _labels=()):
+        series = self._series.get(_labels)
+        if series is None:
+            series = self._series[_labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def samples(self):
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield self.name + "_bucket" + _format_labels(self.label_names + ("le",), labels + (le,)), cumulative
+            yield self.name + "_sum" + _format_labels(self.label_names, labels), total
+            yield self.name + "_count" + _format_labels(self.label_names, labels), cumulative
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, callback=None, labels=()):
+        return self._register(Gauge(name, help_text, callback, labels))
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS, labels=()):
+        return self._register(Histogram(name, help_text, buckets, labels))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Texto no formato de exposição do Prometheus"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample_name, value in metric.samples():
+                lines.append(f"{sample_name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class SampledLogger:
+    """Log de eventos repetitivos: registra a 1ª ocorrência e depois 1 a cada `every`"""
+
+    def __init__(self, logger, every=100):
+        self.logger = logger
+        self.every = max(1, every)
+        self._counts = {}
+
+    def log(self, level, key, message, *args):
+        count = self._counts.get(key, 0) + 1
+        self._counts[key] = count
+        if count % self.every == 1 or self.every == 1:
+            if self.logger.isEnabledFor(level):
+                self.logger.log(level, message + " [%d ocorrências]", *args, count)
+        elif self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(message, *args)
+
+    def info(self, key, message, *args):
+        self.log(logging.INFO, key, message, *args)
+
+    def warning(self, key, message, *args):
+        self.log(logging.WARNING, key, message, *args)
+
+
+async def monitor_event_loop_lag(histogram, interval=0.25):
+    """Mede quanto um sleep curto atrasa além do pedido (tempo em que o loop ficou ocupado)"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        histogram.observe(max(0.0, loop.time() - start - interval))
+
+
+async def serve_metrics(registry, host="127.0.0.1", port=9108):
+    """Endpoint HTTP mínimo: GET /metrics devolve o texto do registro"""
+
+    async def handle(reader, writer):
+        try:
+            request_line = await reader.readline()
+            # Ignora os cabeçalhos
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, content_type = "200 OK", "text/plain; version=0.0.4; charset=utf-8"
+                body = registry.render().encode()
+            else:
+                status, content_type, body = "404 Not Found", "text/plain; charset=utf-8", b"not found\n"
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
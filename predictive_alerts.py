@@ -0,0 +1,194 @@
+# predictive_alerts.py
+from collections import namedtuple
+
+import numpy as np
+
+# Limites usados pelos alertas (mesmos do dashboard)
+PLASMA_WARNING = 5e7
+PLASMA_CRITICAL = 1e8
+CASE_WARNING = 5e7
+LOW_FILL = 0.10
+HIGH_STEAM_FILL = 0.90
+
+SEVERITY_STATUS = ("NORMAL", "ATENCAO", "CRITICO")
+
+# Regra declarativa: `field` cruzou `limit` na direção "acima"/"abaixo" (alerta com `severity`), ou vai
+# cruzar em até `horizon` segundos mantida a tendência da janela (aviso antecipado, severidade ATENCAO).
+# kind None vale para reatores e turbinas.
+AlertRule = namedtuple("AlertRule", "name kind field direction limit severity horizon message")
+
+# Da mais grave para a menos grave: num mesmo campo, só a primeira regra já cruzada é reportada
+ALERT_RULES = (
+    AlertRule("plasma_critico", "reactor", "plasma_temperature", "acima", PLASMA_CRITICAL, 2, 120,
+              "temperatura do plasma crítica"),
+    AlertRule("plasma_alto", "reactor", "plasma_temperature", "acima", PLASMA_WARNING, 1, 120,
+              "temperatura do plasma alta"),
+    AlertRule("casco_alto", "reactor", "case_temperature", "acima", CASE_WARNING, 1, 120,
+              "temperatura do casco alta"),
+    AlertRule("deuterium_baixo", None, "deuterium_fill", "abaixo", LOW_FILL, 1, 600,
+              f"deuterium abaixo de {LOW_FILL:.0%}"),
+    AlertRule("water_baixo", None, "water_fill", "abaixo", LOW_FILL, 1, 600,
+              f"water abaixo de {LOW_FILL:.0%}"),
+    AlertRule("steam_alto", None, "steam_fill", "acima", HIGH_STEAM_FILL, 1, 600,
+              f"steam acima de {HIGH_STEAM_FILL:.0%}"),
+)
+
+DEVICE_LABELS = {"reactor": "Reator", "turbine": "Turbina"}
+
+
+def format_eta(seconds):
+    if seconds < 120:
+        return f"~{seconds:.0f} s"
+    return f"~{seconds / 60:.0f} min"
+
+
+class SeriesMatrix:
+    """Últimas `depth` amostras (t, v) de um campo, uma linha por dispositivo"""
+
+    def __init__(self, depth, rows=8):
+        self.depth = depth
+        self.t = np.full((rows, depth), np.nan)
+        self.v = np.full((rows, depth), np.nan)
+        self.next = [0] * rows  # Próxima coluna a escrever em cada linha (lista: escrita escalar mais barata)
+
+    def ensure_rows(self, rows):
+        if rows <= len(self.next):
+            return
+        size = max(rows, 2 * len(self.next))
+        grow = size - len(self.next)
+        self.t = np.vstack([self.t, np.full((grow, self.depth), np.nan)])
+        self.v = np.vstack([self.v, np.full((grow, self.depth), np.nan)])
+        self.next.extend([0] * grow)
+
+    def add(self, row, t, value):
+        column = self.next[row]
+        self.t[row, column] = t
+        self.v[row, column] = value
+        self.next[row] = (column + 1) % self.depth
+
+    def trend(self, rows, window):
+        """Último valor e inclinação (regressão linear na janela) de todas as linhas de uma vez"""
+        t = self.t[:rows]
+        v = self.v[:rows]
+        last_column = (np.array(self.next[:rows]) - 1) % self.depth
+        index = np.arange(rows)
+        last_t = t[index, last_column]
+        last_v = v[index, last_column]
+
+        with np.errstate(invalid="ignore"):
+            x = t - last_t[:, None]  # Tempo relativo à última amostra (precisão com epoch)
+            inside = x >= -window    # NaN (colunas ainda vazias) fica de fora
+        n = inside.sum(axis=1)
+        x = np.where(inside, x, 0.0)
+        y = np.where(inside, v, 0.0)
+        sx, sy = x.sum(axis=1), y.sum(axis=1)
+        sxx, sxy = (x * x).sum(axis=1), (x * y).sum(axis=1)
+        denominator = n * sxx - sx * sx
+        valid = denominator > 1e-12
+        slope = np.zeros(rows)
+        np.divide(n * sxy - sx * sy, denominator, out=slope, where=valid)
+        return last_v, slope
+
+
+class PredictiveAlerts:
+    """Avalia as regras de alerta para todos os dispositivos de uma vez, em lote.
+
+    A ingestão só grava a amostra na matriz do campo; regressões e regras rodam vetorizadas
+    em evaluate(), então o custo por amostra não cresce com o número de regras.
+    """
+
+    def __init__(self, rules=ALERT_RULES, window=60.0, depth=64):
+        self.rules = tuple(rules)
+        self.window = window
+        self.fields = tuple(dict.fromkeys(rule.field for rule in self.rules))
+        self.depth = depth
+        self.series = {}
+        self.keys = []   # Linha -> (tipo, id)
+        self._rows = {}  # (tipo, id) -> linha
+        self._kinds = np.empty(0, dtype=object)
+
+    def row(self, kind, device_id):
+        """Linha do dispositivo nas matrizes (criada na primeira vez)"""
+        key = (kind, device_id)
+        row = self._rows.get(key)
+        if row is None:
+            row = self._rows[key] = len(self.keys)
+            self.keys.append(key)
+            self._kinds = np.array([k for k, _ in self.keys], dtype=object)
+            for matrix in self.series.values():
+                matrix.ensure_rows(len(self.keys))
+        return row
+
+    def checkpoint_state(self):
+        """Cópia das linhas em uso de cada matriz (para o checkpoint do servidor)"""
+        rows = len(self.keys)
+        return {
+            "keys": [list(key) for key in self.keys],
+            "series": {field: (matrix.t[:rows].copy(), matrix.v[:rows].copy(), matrix.next[:rows])
+                       for field, matrix in self.series.items()},
+        }
+
+    def restore_state(self, state):
+        """Inverso de checkpoint_state() (avaliador recém-criado)"""
+        self.keys = [tuple(key) for key in state["keys"]]
+        self._rows = {key: row for row, key in enumerate(self.keys)}
+        self._kinds = np.array([kind for kind, _ in self.keys], dtype=object)
+        for field, (t, v, next_column) in state["series"].items():
+            matrix = self.series[field] = SeriesMatrix(self.depth, max(8, len(self.keys)))
+            if t.shape[1] != self.depth:
+                continue  # Profundidade mudou: a tendência se refaz com as próximas amostras
+            matrix.t[:len(t)] = t
+            matrix.v[:len(v)] = v
+            matrix.next[:len(next_column)] = list(next_column)
+
+    def add(self, row, field, t, value):
+        matrix = self.series.get(field)
+        if matrix is None:
+            matrix = self.series[field] = SeriesMatrix(self.depth, max(8, len(self.keys)))
+        matrix.add(row, t, value)
+
+    def evaluate(self):
+        """Retorna, por linha, (severidade, alertas, previsões {regra: segundos até o limite})"""
+        rows = len(self.keys)
+        severity = np.zeros(rows, dtype=np.int64)
+        alerts = [[] for _ in range(rows)]
+        predictions = [{} for _ in range(rows)]
+        if rows == 0:
+            return []
+
+        trends = {field: matrix.trend(rows, self.window) for field, matrix in self.series.items()}
+        crossed_fields = set()  # (linha, campo) já com alerta de limite cruzado
+
+        for rule in self.rules:
+            if rule.field not in trends:
+                continue
+            last, slope = trends[rule.field]
+            sign = 1.0 if rule.direction == "acima" else -1.0
+            applies = np.ones(rows, dtype=bool) if rule.kind is None else self._kinds == rule.kind
+            with np.errstate(invalid="ignore"):
+                crossed = applies & (sign * (last - rule.limit) > 0)
+                approaching = applies & ~crossed & (sign * slope > 0)
+            eta = np.full(rows, np.inf)
+            np.divide(rule.limit - last, slope, out=eta, where=approaching)
+
+            # Aviso antecipado: cruza o limite dentro do horizonte
+            early = approaching & (eta <= rule.horizon)
+            severity = np.maximum(severity, np.where(crossed, rule.severity, np.where(early, 1, 0)))
+
+            # Só as linhas com alerta ou previsão passam pelo Python
+            for row in np.flatnonzero(crossed | approaching):
+                if crossed[row]:
+                    if (row, rule.field) in crossed_fields:
+                        continue
+                    crossed_fields.add((row, rule.field))
+                    alerts[row].append(self._message(row, rule.message))
+                else:
+                    predictions[row][rule.name] = float(eta[row])
+                    if early[row]:
+                        alerts[row].append(self._message(row, f"{rule.message} em {format_eta(eta[row])}"))
+
+        return [(int(severity[row]), alerts[row], predictions[row]) for row in range(rows)]
+
+    def _message(self, row, text):
+        kind, device_id = self.keys[row]
+        return f"{DEVICE_LABELS[kind]} {device_id}: {text}"
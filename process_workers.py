@@ -0,0 +1,315 @@
+# process_workers.py
+# Modo multiprocesso: a ingestão só decodifica, responde e grava cada amostra no buffer
+# compartilhado; histórico, análise e snapshot rodam em processos próprios lendo desse buffer.
+import itertools
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+
+from predictive_alerts import SEVERITY_STATUS
+from sample_codec import validate
+from shared_ring import RingReader, SharedSampleRing
+from timeseries_store import TimeSeriesStore
+
+logger = logging.getLogger("fusion")
+
+POLL_INTERVAL = 0.02  # Espera dos processos quando o buffer não tem amostras novas
+HISTORY_REQUEST_TIMEOUT = 2.0  # Espera pela resposta do processo de histórico
+
+
+def _consume(ring_name, capacity, stop, on_sample, on_tick=None, tick_interval=1.0, on_exit=None, serve=None):
+    """Laço comum dos processos: lê as amostras novas e chama on_tick a cada intervalo.
+
+    serve(timeout), se dado, atende pedidos de outros processos; ocioso, o laço espera neles em vez de dormir.
+    """
+    ring = SharedSampleRing.attach(ring_name, capacity)
+    reader = RingReader(ring, start=0)
+    next_tick = time.monotonic() + tick_interval
+    failures = 0
+    try:
+        while not stop.is_set():
+            count = 0
+            for sample in reader.samples():
+                try:
+                    on_sample(*sample)
+                except Exception as e:
+                    # Uma amostra que derrube o processo pararia o histórico/análise/snapshot de todos
+                    failures += 1
+                    if failures & (failures - 1) == 0:  # 1, 2, 4, 8... para não inundar o log
+                        logger.exception("Erro ao processar amostra de %s:%s (%d erros): %s",
+                                         sample[0], sample[1], failures, e)
+                count += 1
+            if on_tick is not None and time.monotonic() >= next_tick:
+                next_tick = time.monotonic() + tick_interval
+                try:
+                    on_tick()
+                except Exception as e:
+                    logger.exception("Erro na tarefa periódica do processo: %s", e)
+            if serve is not None:
+                serve(0 if count else POLL_INTERVAL)
+            elif count == 0:
+                time.sleep(POLL_INTERVAL)
+
+        # Drena o que a ingestão publicou antes de parar
+        for sample in reader.samples():
+            on_sample(*sample)
+        if on_exit is not None:
+            on_exit()
+        if reader.lost:
+            logger.warning("Processo auxiliar perdeu %d amostras (buffer compartilhado sobrescrito)", reader.lost)
+    finally:
+        reader = None
+        ring.close()
+
+
+def storage_worker(ring_name, capacity, stop, history_path, flush_interval, requests, replies):
+    """Histórico em disco (TimeSeriesStore); responde ao processo de ingestão com os registros pendentes"""
+    store = TimeSeriesStore(history_path)
+
+    def serve(timeout):
+        try:
+            request = requests.get(timeout=timeout)
+        except queue.Empty:
+            return
+        while True:
+            request_id, device, field, resolution = request
+            replies.put((request_id, store.unflushed(device, field, resolution)))
+            try:
+                request = requests.get_nowait()
+            except queue.Empty:
+                return
+
+    _consume(ring_name, capacity, stop,
+             lambda kind, device_id, t, dados: store.append_values(f"{kind}:{device_id}", t, validate(kind, dados)[1]),
+             store.flush, flush_interval, lambda: store.flush(close_rollups=True), serve)
+
+
+def analytics_worker(ring_name, capacity, stop, results, interval, initial_state=None, state_interval=None):
+    """Estatísticas e regras de alerta; publica o relatório completo a cada intervalo.
+
+    Com state_interval, publica também o estado completo do engine (para o checkpoint da ingestão)
+    a cada state_interval segundos e ao sair; initial_state é um estado restaurado do checkpoint.
+    """
+    from streaming_analysis import AnalysisEngine
+
+    engine = AnalysisEngine()
+    if initial_state is not None:
+        engine.restore_state(initial_state)
+    pending = [False]
+    state_pending = [False]
+    next_state = [time.monotonic() + (state_interval or 0)]
+
+    def on_sample(kind, device_id, t, dados):
+        engine.update(kind, device_id, t, validate(kind, dados)[1])
+        pending[0] = state_pending[0] = True
+
+    def publish_state():
+        if state_pending[0]:
+            state_pending[0] = False
+            results.put(("estado", engine.checkpoint_state()))
+
+    def publish():
+        if pending[0]:
+            pending[0] = False
+            engine.evaluate()
+            results.put(("relatorio", engine.report()))
+        if state_interval and time.monotonic() >= next_state[0]:
+            next_state[0] = time.monotonic() + state_interval
+            publish_state()
+
+    def on_exit():
+        publish()
+        if state_interval:
+            publish_state()
+
+    _consume(ring_name, capacity, stop, on_sample, publish, interval, on_exit)
+
+
+def snapshot_worker(ring_name, capacity, stop, snapshot_path, interval, initial=()):
+    """Exporta o fusion_data.json com o último estado de cada dispositivo.
+
+    initial: (tipo, id, dados, derivados) já conhecidos pela ingestão (checkpoint restaurado).
+    """
+    from derived_metrics import DerivedMetrics
+    from fusion_analyzer import SnapshotWriter, snapshot_document
+
+    writer = SnapshotWriter(snapshot_path, None)
+    devices = {"reactor": {}, "turbine": {}}
+    derived_metrics = DerivedMetrics()
+    derived = {}
+    for kind, device_id, dados, device_derived in initial:
+        devices[kind][device_id] = dados
+        derived[f"{kind}:{device_id}"] = device_derived
+    dirty = [False]
+
+    def on_sample(kind, device_id, t, dados):
+        devices[kind][device_id] = dados
+        derived[f"{kind}:{device_id}"] = derived_metrics.compute(kind, device_id, t, validate(kind, dados)[1])
+        dirty[0] = True
+
+    def export():
+        if dirty[0]:
+            dirty[0] = False
+            writer.write_now(snapshot_document(devices["reactor"], devices["turbine"], derivados=derived))
+
+    _consume(ring_name, capacity, stop, on_sample, export, interval, export)
+
+
+class PublishedAnalysis:
+    """Leitura do último relatório do processo de análise, com a interface do AnalysisEngine"""
+
+    def __init__(self):
+        self.latest = None  # Relatório completo (AnalysisEngine.report()) mais recente
+        self.engine_state = None  # AnalysisEngine.checkpoint_state() mais recente (checkpoint)
+
+    def report(self, device_id=None):
+        return self._select(None if device_id is None else {device_id}, with_fields=True)
+
+    def alert_state(self, device_ids=None):
+        return self._select(device_ids, with_fields=False)
+
+    def _select(self, device_ids, with_fields):
+        latest = self.latest
+        selected = {}
+        if latest is not None:
+            selected = {key: summary for key, summary in latest["dispositivos"].items()
+                        if device_ids is None or key.split(":", 1)[1] in device_ids}
+        if not selected:
+            return {"status_sistema": "AGUARDANDO_DADOS", "alertas": [], "dispositivos": {}}
+
+        severity = max(SEVERITY_STATUS.index(summary["status"]) for summary in selected.values())
+        if not with_fields:
+            selected = {key: {"status": summary["status"], "alertas": summary["alertas"],
+                              "previsoes": summary["previsoes"]} for key, summary in selected.items()}
+        return {
+            "status_sistema": SEVERITY_STATUS[severity],
+            "alertas": [alert for summary in selected.values() for alert in summary["alertas"]],
+            "dispositivos": selected,
+        }
+
+
+class WorkerHistoryStore(TimeSeriesStore):
+    """Leitura do histórico no processo de ingestão: segmentos direto do disco, registros ainda não
+    gravados (e buckets agregados em aberto) pedidos ao processo de histórico, que é quem escreve"""
+
+    def __init__(self, root, pool):
+        super().__init__(root)
+        self.pool = pool
+
+    def unflushed(self, device, field, resolution="raw"):
+        return self.pool.unflushed(device, field, resolution)
+
+
+class WorkerPool:
+    """Inicia e encerra os processos auxiliares que leem o buffer compartilhado"""
+
+    def __init__(self, ring, history_path, snapshot_path, snapshot_interval=1.0, history_flush_interval=5.0,
+                 analysis_interval=1.0, analysis_state_interval=None):
+        self.ring = ring
+        self.history_path = history_path
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.history_flush_interval = history_flush_interval
+        self.analysis_interval = analysis_interval
+        self.analysis_state_interval = analysis_state_interval  # None: o engine não publica o estado
+        self.analysis = PublishedAnalysis()
+        self.processes = {}
+        self._stop = None
+        self._results = None
+        self._receiver = None
+        self._history_requests = None
+        self._history_replies = None
+        self._history_lock = threading.Lock()  # Um pedido por vez (leituras rodam em threads)
+        self._request_ids = itertools.count()
+        self._reported_dead = set()
+
+    def start(self, devices=(), analysis_state=None):
+        """devices: (tipo, id, dados, derivados) que o snapshot já deve conter;
+        analysis_state: AnalysisEngine.checkpoint_state() restaurado do checkpoint"""
+        context = multiprocessing.get_context("spawn")
+        self._stop = context.Event()
+        self._results = context.Queue()
+        common = (self.ring.name, self.ring.capacity, self._stop)
+
+        workers = {
+            "analise": (analytics_worker, common + (self._results, self.analysis_interval, analysis_state,
+                                                    self.analysis_state_interval)),
+            "snapshot": (snapshot_worker, common + (self.snapshot_path, self.snapshot_interval, list(devices))),
+        }
+        if self.history_path:
+            self._history_requests = context.Queue()
+            self._history_replies = context.Queue()
+            workers["historico"] = (storage_worker, common + (self.history_path, self.history_flush_interval,
+                                                              self._history_requests, self._history_replies))
+
+        for name, (target, args) in workers.items():
+            process = context.Process(target=target, args=args, name=f"fusion-{name}", daemon=True)
+            process.start()
+            self.processes[name] = process
+        self._receiver = threading.Thread(target=self._receive_results, daemon=True)
+        self._receiver.start()
+
+    def alive(self):
+        """Quantos processos auxiliares ainda estão rodando"""
+        return sum(process.is_alive() for process in self.processes.values())
+
+    def check(self):
+        """Avisa (uma vez por processo) se algum processo auxiliar morreu; retorna os nomes dos mortos"""
+        dead = [name for name, process in self.processes.items() if not process.is_alive()]
+        for name in dead:
+            if name not in self._reported_dead:
+                self._reported_dead.add(name)
+                logger.error("Processo auxiliar %s terminou (código %s)", name,
+                             self.processes[name].exitcode)
+        return dead
+
+    def unflushed(self, device, field, resolution):
+        """Registros pendentes de uma série no processo de histórico (b"" se ele não responder)"""
+        process = self.processes.get("historico")
+        if process is None or not process.is_alive():
+            return b""
+        with self._history_lock:
+            request_id = next(self._request_ids)
+            self._history_requests.put((request_id, device, field, resolution))
+            deadline = time.monotonic() + HISTORY_REQUEST_TIMEOUT
+            while True:
+                try:
+                    reply_id, data = self._history_replies.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    logger.warning("Processo de histórico não respondeu; consulta sem os registros pendentes")
+                    return b""
+                if reply_id == request_id:
+                    return data
+                # Resposta atrasada de um pedido que já desistiu: descarta
+
+    def _receive_results(self):
+        while True:
+            try:
+                message = self._results.get()
+            except (EOFError, OSError, ValueError):
+                return  # Fila fechada no stop()
+            if message is None:
+                return
+            kind, payload = message
+            if kind == "relatorio":
+                self.analysis.latest = payload
+            else:
+                self.analysis.engine_state = payload
+
+    def stop(self, timeout=10):
+        """Pede a parada, espera os processos drenarem o buffer e gravarem o pendente"""
+        if self._stop is None:
+            return
+        self._stop.set()
+        for name, process in self.processes.items():
+            process.join(timeout)
+            if process.is_alive():
+                logger.warning("Processo %s não terminou; encerrando", name)
+                process.terminate()
+        self._results.put(None)
+        # Espera o estado final do engine (publicado ao sair) antes do último checkpoint
+        self._receiver.join(timeout)
+        self.processes = {}
+        self._stop = None
@@ -4,16 +4,38 @@ local Config = {
     SERVER_IP = "",  -- ALTERE PARA SEU IP
     SERVER_PORT = 8765,
     UPDATE_INTERVAL = 2,  -- segundos
+    DEVICE_ID = nil,  -- Id deste reator/turbina no servidor (padrão: label ou id do computador)
+    BATCH_MODE = false,  -- true: coleta a cada SAMPLE_INTERVAL e envia lotes sem esperar confirmação
+    SAMPLE_INTERVAL = 0.5,  -- segundos entre coletas no modo lote
+    MAX_BUFFERED_SAMPLES = 200,  -- sem conexão, descarta as amostras mais antigas acima disso
+    WIRE_FORMAT = "json",  -- "delta": negocia o formato compacto (só campos alterados + keyframes)
     WEBSOCKET_URL = nil  -- Será preenchido automaticamente
 }
 
 Config.WEBSOCKET_URL = "ws://" .. Config.SERVER_IP .. ":" .. Config.SERVER_PORT
+Config.DEVICE_ID = Config.DEVICE_ID or os.getComputerLabel() or ("cc-" .. os.getComputerID())
 
 local websocket = nil
 local dadosReator = {}
 local dadosTurbina = {}
 local analiseRecebida = {}
 
+-- Estado do modo lote
+local amostrasPendentes = {}
+local lotesNaoConfirmados = {}  -- Lotes enviados, em ordem de seq, até chegar a confirmação
+local seqLote = 0
+local ultimoSeqConfirmado = 0
+local sessaoLote = os.epoch("utc")  -- Identifica esta execução: o servidor descarta lotes repetidos
+
+-- Estado do formato compacto (delta)
+local camposDelta = nil  -- nome do campo -> id, preenchido na negociação
+local intervaloChave = 30
+local ultimosValores = {r = {}, t = {}}
+local seqFrame = {r = 0, t = 0}
+local framesDesdeChave = {r = 0, t = 0}
+local forcarChave = {r = true, t = true}
+local negociarFormato  -- Definida abaixo; chamada ao conectar
+
 -- Funções de comunicação com WebSocket
 local function conectarServidor()
     print("🔗 Conectando ao servidor Fusion...")
@@ -36,6 +58,7 @@ local function conectarServidor()
             end
         end
         
+        negociarFormato()
         return true
     else
         print("❌ Falha na conexão: " .. tostring(ws))
@@ -51,6 +74,7 @@ local function enviarMensagem(tipo, dados)
     
     local mensagem = {
         tipo = tipo,
+        id = Config.DEVICE_ID,
         timestamp = os.epoch("utc"),
         dados = dados or {}
     }
@@ -71,6 +95,26 @@ local function receberMensagem(timeout)
     return nil
 end
 
+function negociarFormato()
+    camposDelta = nil
+    if Config.WIRE_FORMAT ~= "delta" or not websocket then
+        return
+    end
+    
+    websocket.send(textutils.serializeJSON({tipo = "negociar", formato = "delta"}))
+    local resposta = receberMensagem(1)
+    if resposta and resposta.tipo == "formato" and resposta.formato == "delta" then
+        camposDelta = {}
+        for i, nome in ipairs(resposta.campos) do
+            camposDelta[nome] = i - 1
+        end
+        intervaloChave = resposta.intervalo_chave or intervaloChave
+        -- Nova conexão: o servidor precisa de uma base completa
+        forcarChave = {r = true, t = true}
+        print("📦 Formato compacto ativo")
+    end
+end
+
 -- Funções de coleta de dados das peripherals
 local function coletarDadosReator()
     local dados = {}
@@ -130,16 +174,81 @@ local function coletarDadosTurbina()
     return dados
 end
 
+-- Funções do formato compacto
+local function valorCompacto(valor)
+    -- Tabelas do Mekanism (ex.: deutério) viajam só com a quantidade
+    if type(valor) == "table" then
+        return valor.amount
+    end
+    return valor
+end
+
+local function montarFrame(d, dados, agora)
+    local chave = forcarChave[d] or framesDesdeChave[d] >= intervaloChave
+    local anteriores = ultimosValores[d]
+    local atuais, pares, extras = {}, {}, {}
+    
+    for nome, valor in pairs(dados) do
+        valor = valorCompacto(valor)
+        if valor ~= nil then
+            atuais[nome] = valor
+            if chave or anteriores[nome] ~= valor then
+                local id = camposDelta[nome]
+                if id then
+                    table.insert(pares, id)
+                    table.insert(pares, valor)
+                else
+                    extras[nome] = valor
+                end
+            end
+        end
+    end
+    
+    ultimosValores[d] = atuais
+    seqFrame[d] = seqFrame[d] + 1
+    if chave then
+        forcarChave[d] = false
+        framesDesdeChave[d] = 0
+    else
+        framesDesdeChave[d] = framesDesdeChave[d] + 1
+    end
+    
+    local frame = {tipo = chave and "k" or "d", d = d, s = seqFrame[d], ts = agora, c = pares}
+    if next(extras) ~= nil then
+        frame.x = extras
+    end
+    return frame
+end
+
+local function montarAmostra(tipo, dados, agora)
+    if not camposDelta then
+        return {tipo = tipo, timestamp = agora, dados = dados}
+    end
+    return montarFrame(tipo == "dados_reator" and "r" or "t", dados, agora)
+end
+
+local function enviarAmostra(tipo, dados)
+    if not camposDelta then
+        return enviarMensagem(tipo, dados)
+    end
+    
+    local frame = montarAmostra(tipo, dados, os.epoch("utc"))
+    frame.i = Config.DEVICE_ID
+    return websocket.send(textutils.serializeJSON(frame))
+end
+
 -- Funções de envio de dados
 local function enviarDadosReator()
     dadosReator = coletarDadosReator()
     if next(dadosReator) ~= nil then
-        if enviarMensagem("dados_reator", dadosReator) then
+        if enviarAmostra("dados_reator", dadosReator) then
             -- Aguarda confirmação
             local resposta = receberMensagem(1)
             if resposta and resposta.tipo == "confirmacao" then
                 print("✅ Dados do reator enviados")
                 return true
+            elseif resposta and resposta.tipo == "solicitar_chave" then
+                forcarChave[resposta.d] = true
             end
         end
     end
@@ -149,12 +258,14 @@ end
 local function enviarDadosTurbina()
     dadosTurbina = coletarDadosTurbina()
     if next(dadosTurbina) ~= nil then
-        if enviarMensagem("dados_turbina", dadosTurbina) then
+        if enviarAmostra("dados_turbina", dadosTurbina) then
             -- Aguarda confirmação
             local resposta = receberMensagem(1)
             if resposta and resposta.tipo == "confirmacao" then
                 print("✅ Dados da turbina enviados")
                 return true
+            elseif resposta and resposta.tipo == "solicitar_chave" then
+                forcarChave[resposta.d] = true
             end
         end
     end
@@ -173,6 +284,96 @@ local function solicitarAnalise()
     return false
 end
 
+-- Funções do modo lote
+-- Limita a memória enquanto o servidor estiver fora: descarta os lotes não confirmados mais antigos,
+-- depois as amostras mais antigas
+local function descartarExcesso()
+    local total = #amostrasPendentes
+    for _, lote in ipairs(lotesNaoConfirmados) do
+        total = total + #lote.amostras
+    end
+    while total > Config.MAX_BUFFERED_SAMPLES and #lotesNaoConfirmados > 0 do
+        total = total - #table.remove(lotesNaoConfirmados, 1).amostras
+    end
+    while total > Config.MAX_BUFFERED_SAMPLES do
+        table.remove(amostrasPendentes, 1)
+        total = total - 1
+    end
+end
+
+local function coletarAmostras()
+    local agora = os.epoch("utc")
+    
+    dadosReator = coletarDadosReator()
+    if next(dadosReator) ~= nil then
+        table.insert(amostrasPendentes, montarAmostra("dados_reator", dadosReator, agora))
+    end
+    
+    dadosTurbina = coletarDadosTurbina()
+    if next(dadosTurbina) ~= nil then
+        table.insert(amostrasPendentes, montarAmostra("dados_turbina", dadosTurbina, agora))
+    end
+    
+    descartarExcesso()
+end
+
+local function enviarLote()
+    if not websocket or #amostrasPendentes == 0 then
+        return false
+    end
+    
+    seqLote = seqLote + 1
+    local mensagem = {
+        tipo = "lote",
+        id = Config.DEVICE_ID,
+        seq = seqLote,
+        sessao = sessaoLote,
+        timestamp = os.epoch("utc"),
+        amostras = amostrasPendentes
+    }
+    
+    -- Não espera confirmação: ela chega como evento websocket_message. Até lá o lote fica guardado
+    -- para ser reenviado se a conexão cair.
+    local ok = pcall(websocket.send, textutils.serializeJSON(mensagem))
+    if ok then
+        table.insert(lotesNaoConfirmados, mensagem)
+        amostrasPendentes = {}
+    else
+        seqLote = seqLote - 1
+    end
+    return ok
+end
+
+-- Depois de reconectar: reenvia, em ordem, os lotes cuja confirmação não chegou
+local function reenviarLotes()
+    for _, mensagem in ipairs(lotesNaoConfirmados) do
+        mensagem.timestamp = os.epoch("utc")  -- O servidor calcula a idade das amostras por este envio
+        if not pcall(websocket.send, textutils.serializeJSON(mensagem)) then
+            return false
+        end
+    end
+    return true
+end
+
+local function tratarMensagem(mensagem)
+    local dados = textutils.unserializeJSON(mensagem)
+    if not dados then
+        return
+    end
+    
+    if dados.tipo == "confirmacao" and dados.seq then
+        -- Confirmação cumulativa: tudo até este seq chegou ao servidor
+        ultimoSeqConfirmado = math.max(ultimoSeqConfirmado, dados.seq)
+        while lotesNaoConfirmados[1] and lotesNaoConfirmados[1].seq <= ultimoSeqConfirmado do
+            table.remove(lotesNaoConfirmados, 1)
+        end
+    elseif dados.tipo == "analise" then
+        analiseRecebida = dados.dados
+    elseif dados.tipo == "solicitar_chave" then
+        forcarChave[dados.d] = true
+    end
+end
+
 -- Função para exibir dados na tela
 local function exibirInterface()
     term.clear()
@@ -180,7 +381,12 @@ local function exibirInterface()
     
     print("=== FUSION REACTOR MONITOR ===")
     print("Servidor: " .. Config.SERVER_IP)
+    print("Dispositivo: " .. Config.DEVICE_ID)
     print("Status: " .. (websocket and "CONECTADO" or "DESCONECTADO"))
+    if Config.BATCH_MODE then
+        print("Lotes: " .. ultimoSeqConfirmado .. "/" .. seqLote .. " confirmados, " .. #lotesNaoConfirmados ..
+              " aguardando, " .. #amostrasPendentes .. " amostras pendentes")
+    end
     print("")
     
     -- Exibe dados do reator
@@ -272,6 +478,51 @@ local function mainLoop()
     end
 end
 
+-- Loop do modo lote: coleta sub-segundo, um frame por UPDATE_INTERVAL
+local function mainLoopLote()
+    local timerColeta = os.startTimer(Config.SAMPLE_INTERVAL)
+    local timerEnvio = os.startTimer(Config.UPDATE_INTERVAL)
+    
+    while true do
+        local event, id, x, y = os.pullEvent()
+        
+        if event == "timer" and id == timerColeta then
+            coletarAmostras()
+            timerColeta = os.startTimer(Config.SAMPLE_INTERVAL)
+            
+        elseif event == "timer" and id == timerEnvio then
+            -- Reconecta se necessário
+            if not websocket and conectarServidor() then
+                reenviarLotes()
+            end
+            
+            if websocket then
+                enviarLote()
+                enviarMensagem("solicitar_analise")
+                exibirInterface()
+            else
+                print("❌ Sem conexão com o servidor")
+            end
+            
+            timerEnvio = os.startTimer(Config.UPDATE_INTERVAL)
+            
+        elseif event == "websocket_message" then
+            tratarMensagem(x)
+            
+        elseif event == "websocket_closed" or event == "websocket_failure" then
+            print("🔌 Conexão WebSocket perdida")
+            websocket = nil
+            
+        elseif event == "terminate" then
+            if websocket then
+                websocket.close()
+            end
+            print("👋 Programa finalizado")
+            break
+        end
+    end
+end
+
 -- Função principal
 local function main()
     print("=== CLIENTE FUSION REACTOR ===")
@@ -280,7 +531,11 @@ local function main()
     if conectarServidor() then
         print("✅ Conectado! Iniciando monitoramento...")
         exibirInterface()
-        mainLoop()
+        if Config.BATCH_MODE then
+            mainLoopLote()
+        else
+            mainLoop()
+        end
     else
         print("❌ Não foi possível conectar ao servidor")
         print("Verifique:")
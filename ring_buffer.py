@@ -0,0 +1,51 @@
+# ring_buffer.py
+import numpy as np
+
+
+class ColumnarRingBuffer:
+    """Buffer circular pré-alocado com várias colunas alinhadas (uma linha por amostra).
+
+    Cada linha é gravada duas vezes (posição i e i + capacidade), assim as últimas
+    N linhas sempre formam uma fatia contígua e podem ser lidas sem cópia.
+    """
+
+    def __init__(self, columns, capacity, dtype=np.float64):
+        if capacity < 1:
+            raise ValueError("capacidade deve ser >= 1")
+        self.columns = tuple(columns)
+        self.capacity = capacity
+        self._column_index = {name: i for i, name in enumerate(self.columns)}
+        self._data = np.full((len(self.columns), 2 * capacity), np.nan, dtype=dtype)
+        self._head = 0  # Próxima posição de escrita
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, row):
+        """Adiciona uma linha (valores na ordem das colunas) em O(1)"""
+        head = self._head
+        self._data[:, head] = row
+        self._data[:, head + self.capacity] = row
+        self._head = head + 1 if head + 1 < self.capacity else 0
+        if self._size < self.capacity:
+            self._size += 1
+
+    def view(self, column, last=None):
+        """Visão (sem cópia) das últimas linhas de uma coluna, da mais antiga para a mais nova.
+
+        A visão aponta para o buffer: deixa de ser válida após novas escritas.
+        """
+        count = self._size if last is None else min(last, self._size)
+        end = self._head + self.capacity if self._head < self._size else self._head
+        return self._data[self._column_index[column], end - count:end]
+
+    def latest(self, column):
+        if self._size == 0:
+            return None
+        return self._data[self._column_index[column], self._head - 1]
+
+    def clear(self):
+        self._head = 0
+        self._size = 0
+        self._data.fill(np.nan)
@@ -0,0 +1,99 @@
+# sample_codec.py
+# Decodificação das mensagens: JSON pelo orjson quando instalado (biblioteca padrão se não) e
+# validação das amostras contra o esquema fixo de cada tipo de dispositivo. A validação já entrega
+# os valores numéricos resolvidos (float, tabelas pelo "amount") para análise, derivadas e histórico.
+import json
+
+try:
+    import orjson
+except ImportError:  # Opcional: sem ele só a decodificação fica mais lenta
+    orjson = None
+
+# Campos que o cliente Lua coleta de cada dispositivo; precisam ser número ou tabela {"amount": número}.
+# Campos fora do esquema (extras "x" do formato compacto) passam como vieram nos dados, mas não viram
+# valores: análise e histórico (um diretório por campo) só recebem campos do esquema.
+SCHEMAS = {
+    "reactor": frozenset((
+        "deuterium", "deuterium_capacity", "injection_rate", "plasma_temperature", "case_temperature",
+        "water", "water_capacity", "steam", "steam_capacity", "production_rate", "energy", "max_energy",
+    )),
+    "turbine": frozenset((
+        "flow_rate", "max_flow_rate", "steam", "steam_capacity", "production_rate", "max_production",
+        "energy", "max_energy",
+    )),
+}
+
+
+MAX_ID_BYTES = 64  # Id do dispositivo em UTF-8 (também o tamanho do nome no buffer compartilhado)
+
+
+class SampleError(ValueError):
+    """Amostra que não dá para aproveitar (dados não são um objeto, id inválido)"""
+
+
+def _to_builtin(value):
+    # Escalares do NumPy que escapem para uma resposta
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"tipo não serializável: {type(value).__name__}")
+
+
+if orjson is not None:
+    loads = orjson.loads  # orjson.JSONDecodeError herda de json.JSONDecodeError
+
+    def dumps(message):
+        return orjson.dumps(message, default=_to_builtin).decode()
+else:
+    loads = json.loads
+
+    def dumps(message):
+        return json.dumps(message, separators=(',', ':'))
+
+
+def normalize_id(value, default):
+    """Id anunciado pelo cliente como texto: o Lua pode mandar número (1 -> "1"); objeto/lista é recusado.
+
+    Ids sempre str mantêm as chaves dos dicionários serializáveis (orjson só aceita chave str).
+    """
+    if value is None:
+        return default
+    value_type = type(value)
+    if value_type is str:
+        return value
+    if value_type is int:
+        return str(value)
+    if value_type is float:
+        return str(int(value)) if value.is_integer() else str(value)
+    raise SampleError(f"id de dispositivo inválido: {value!r:.50}")
+
+
+def validate(kind, dados):
+    """Confere a amostra com o esquema do tipo.
+
+    Retorna (dados aceitos, {campo: float} dos campos numéricos do esquema, campos rejeitados). Campos
+    do esquema com valor inválido saem dos dados; o dicionário original só é copiado nesse caso.
+    """
+    if type(dados) is not dict:
+        if dados == []:  # textutils.serializeJSON pode mandar a tabela vazia como lista
+            return {}, {}, ()
+        raise SampleError(f"dados de {kind} não são um objeto")
+
+    schema = SCHEMAS[kind]
+    values = {}
+    rejected = None
+    for field, value in dados.items():
+        if field not in schema:
+            continue
+        if type(value) is dict:
+            value = value.get("amount")
+        value_type = type(value)
+        if value_type is float or value_type is int:  # bool fica de fora
+            values[field] = float(value)
+        else:
+            if rejected is None:
+                rejected = []
+            rejected.append(field)
+
+    if rejected is None:
+        return dados, values, ()
+    return {field: value for field, value in dados.items() if field not in rejected}, values, rejected
@@ -0,0 +1,161 @@
+# server_checkpoint.py
+# Checkpoint binário do estado em memória do servidor: último valor e derivadas de cada dispositivo,
+# janelas da análise e matrizes das regras de alerta. Na partida o servidor volta desse arquivo
+# em vez de começar vazio (e de apagar o fusion_data.json).
+#
+# Layout do arquivo:
+#   cabeçalho: MAGIC, versão u4, tamanho do índice u8 (little-endian)
+#   índice   : JSON com a parte irregular do estado ("meta") e nome/dtype/forma/deslocamento de cada array
+#   arrays   : blocos numéricos (amostras das janelas, deques de mín/máx, matrizes do avaliador),
+#              alinhados em 8 bytes e lidos sem cópia com np.frombuffer
+import gc
+import json
+import os
+import struct
+from collections import deque
+from contextlib import contextmanager
+from itertools import chain, islice
+
+import numpy as np
+
+CHECKPOINT_VERSION = 1
+MAGIC = b"FCKP"
+HEADER = struct.Struct('<4sIQ')
+
+
+class CheckpointError(Exception):
+    """Checkpoint ilegível ou de outra versão (o servidor parte vazio)"""
+
+
+def _pairs(lists):
+    """Listas de (t, v) concatenadas -> arrays t, v e a quantidade de cada lista"""
+    counts = np.fromiter((len(items) for items in lists), dtype=np.int64, count=len(lists))
+    flat = np.fromiter(chain.from_iterable(chain.from_iterable(lists)), dtype=np.float64, count=2 * int(counts.sum()))
+    return flat[0::2].copy(), flat[1::2].copy(), counts
+
+
+def _unpairs(t, v, counts):
+    """Inverso de _pairs: um deque de tuplas (t, v) por entrada"""
+    pairs = zip(t.tolist(), v.tolist())
+    return [deque(islice(pairs, count)) for count in counts.tolist()]
+
+
+@contextmanager
+def gc_paused(freeze=False):
+    """Sem coleta de lixo durante a captura/restauração: são centenas de milhares de tuplas novas
+    e cada coleta completa percorreria todas elas de novo.
+
+    freeze=True tira os objetos criados (estado restaurado, de vida longa) das coletas seguintes.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if freeze:
+            gc.freeze()
+        if enabled:
+            gc.enable()
+
+
+def save_checkpoint(path, state):
+    """Grava o estado (FusionServer.checkpoint_state) de forma atômica; roda fora do event loop"""
+    meta = dict(state)
+    arrays = {}
+
+    analysis = state.get("analysis")
+    if analysis is not None:
+        scalars, samples, minimums, maximums = [], [], [], []
+        devices = []
+        for device in analysis["devices"]:
+            device = dict(device)
+            stats = device.pop("stats")
+            device["fields"] = list(stats)
+            for exported in stats.values():
+                scalars.append([np.nan if value is None else value for value in exported[0]])
+                samples.append(exported[1])
+                minimums.append(exported[2])
+                maximums.append(exported[3])
+            devices.append(device)
+
+        arrays["stat_scalars"] = np.array(scalars, dtype=np.float64).reshape(-1, 11)
+        for name, lists in (("samples", samples), ("min", minimums), ("max", maximums)):
+            arrays[f"{name}_t"], arrays[f"{name}_v"], arrays[f"{name}_count"] = _pairs(lists)
+
+        predictive = analysis["predictive"]
+        fields = list(predictive["series"])
+        for i, field in enumerate(fields):
+            t, v, next_column = predictive["series"][field]
+            arrays[f"series{i}_t"] = t
+            arrays[f"series{i}_v"] = v
+            arrays[f"series{i}_next"] = np.array(next_column, dtype=np.int64)
+        meta["analysis"] = {"window": analysis["window"], "devices": devices,
+                            "predictive": {"keys": predictive["keys"], "fields": fields}}
+
+    index = []
+    offset = 0
+    for name, array in arrays.items():
+        array = arrays[name] = np.ascontiguousarray(array)
+        offset = (offset + 7) // 8 * 8
+        index.append([name, array.dtype.str, list(array.shape), offset])
+        offset += array.nbytes
+    header = json.dumps({"meta": meta, "arrays": index, "size": offset}, separators=(',', ':')).encode()
+
+    # Escreve em arquivo temporário e renomeia: um checkpoint pela metade nunca substitui o anterior
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, CHECKPOINT_VERSION, len(header)))
+        f.write(header)
+        start = f.tell()
+        for (_, _, _, array_offset), array in zip(index, arrays.values()):
+            f.write(b"\0" * (start + array_offset - f.tell()))
+            f.write(array.tobytes())
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path):
+    """Lê um checkpoint; None se não existe, CheckpointError se não dá para usar"""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        data = f.read()
+    try:
+        magic, version, header_size = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise CheckpointError("arquivo não é um checkpoint do servidor")
+        if version != CHECKPOINT_VERSION:
+            raise CheckpointError(f"versão {version} do checkpoint não suportada")
+        header = json.loads(data[HEADER.size:HEADER.size + header_size])
+        start = HEADER.size + header_size
+        if len(data) != start + header["size"]:
+            raise CheckpointError("checkpoint truncado")
+        arrays = {}
+        for name, dtype, shape, offset in header["arrays"]:
+            dtype = np.dtype(dtype)
+            count = int(np.prod(shape))
+            arrays[name] = np.frombuffer(data, dtype, count, start + offset).reshape(shape)
+    except (struct.error, ValueError, KeyError) as e:
+        raise CheckpointError(f"checkpoint ilegível: {e}") from e
+    state = header["meta"]
+
+    analysis = state.get("analysis")
+    if analysis is not None:
+        scalars = arrays["stat_scalars"].tolist()
+        samples, minimums, maximums = (
+            _unpairs(arrays[f"{name}_t"], arrays[f"{name}_v"], arrays[f"{name}_count"])
+            for name in ("samples", "min", "max"))
+        index = 0
+        for device in analysis["devices"]:
+            stats = {}
+            for field in device.pop("fields"):
+                row = [None if value != value else value for value in scalars[index]]  # NaN -> None
+                row[5] = int(row[5])  # Contagem
+                stats[field] = (tuple(row), samples[index], minimums[index], maximums[index])
+                index += 1
+            device["stats"] = stats
+
+        predictive = analysis["predictive"]
+        predictive["series"] = {field: (arrays[f"series{i}_t"], arrays[f"series{i}_v"],
+                                        arrays[f"series{i}_next"].tolist())
+                                for i, field in enumerate(predictive.pop("fields"))}
+    return state
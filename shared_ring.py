@@ -0,0 +1,194 @@
+# shared_ring.py
+# Buffer circular de amostras em memória compartilhada: um processo escreve (ingestão),
+# vários processos leem (histórico, análise, snapshot) direto do mesmo bloco, sem cópia nem pickle.
+#
+# Layout do bloco:
+#   cabeçalho   : [sequência de escrita u8, dispositivos registrados u8]
+#   nomes       : MAX_DEVICES x S64   -> id anunciado de cada dispositivo
+#   sequências  : capacidade x u8     -> sequência gravada em cada posição (detecta sobrescrita)
+#   tempos      : capacidade x f8
+#   tipos       : capacidade x u1     -> índice em KINDS
+#   dispositivos: capacidade x u2     -> índice em nomes
+#   tabelas     : capacidade x u2     -> bits dos campos que vieram como tabela {"amount": ...}
+#   valores     : capacidade x len(FIELD_NAMES) x f8 (NaN = campo ausente na amostra)
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from sample_codec import MAX_ID_BYTES
+from wire_format import FIELD_IDS, FIELD_NAMES
+
+KINDS = ("reactor", "turbine")
+KIND_INDEX = {kind: i for i, kind in enumerate(KINDS)}
+MAX_DEVICES = 1024
+NAME_SIZE = MAX_ID_BYTES  # Ids maiores são recusados na ingestão
+DEFAULT_CAPACITY = 65536  # Amostras; ~2 min de folga para 500 dispositivos a cada 2 s
+UNWRITTEN = np.iinfo(np.uint64).max  # Sequência de posição vazia ou sendo regravada
+
+
+def _layout(capacity):
+    """Deslocamento (bytes) e forma de cada região do bloco"""
+    regions = (
+        ("header", np.uint64, (2,)),
+        ("names", f"S{NAME_SIZE}", (MAX_DEVICES,)),
+        ("seqs", np.uint64, (capacity,)),
+        ("times", np.float64, (capacity,)),
+        ("kinds", np.uint8, (capacity,)),
+        ("devices", np.uint16, (capacity,)),
+        ("tables", np.uint16, (capacity,)),
+        ("values", np.float64, (capacity, len(FIELD_NAMES))),
+    )
+    layout = {}
+    offset = 0
+    for name, dtype, shape in regions:
+        dtype = np.dtype(dtype)
+        offset = (offset + 7) // 8 * 8  # Alinha em 8 bytes
+        layout[name] = (offset, dtype, shape)
+        offset += dtype.itemsize * int(np.prod(shape))
+    return layout, offset
+
+
+class SharedSampleRing:
+    """Visões NumPy sobre o bloco compartilhado; use create() no escritor e attach() nos leitores"""
+
+    def __init__(self, shm, capacity, owner):
+        self.shm = shm
+        self.capacity = capacity
+        self.owner = owner
+        layout, _ = _layout(capacity)
+        for name, (offset, dtype, shape) in layout.items():
+            setattr(self, name, np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset))
+        self._device_index = {}  # (só no escritor) id -> índice em names
+
+    @classmethod
+    def create(cls, capacity=DEFAULT_CAPACITY):
+        if len(FIELD_NAMES) > 16:
+            raise ValueError("o bitmap de tabelas comporta no máximo 16 campos")
+        _, size = _layout(capacity)
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        ring = cls(shm, capacity, owner=True)
+        ring.header[:] = 0
+        ring.seqs[:] = UNWRITTEN
+        return ring
+
+    @classmethod
+    def attach(cls, name, capacity):
+        return cls(shared_memory.SharedMemory(name=name), capacity, owner=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def write_seq(self):
+        return int(self.header[0])
+
+    def close(self):
+        # As visões precisam sumir antes de fechar o mapeamento
+        for name in _layout(self.capacity)[0]:
+            setattr(self, name, None)
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def can_add(self, device_id):
+        """Se o id cabe no buffer (já registrado, ou há vaga e ele cabe em NAME_SIZE bytes)"""
+        if device_id in self._device_index:
+            return True
+        return len(self._device_index) < MAX_DEVICES and len(device_id.encode()) <= NAME_SIZE
+
+    def _device(self, device_id):
+        index = self._device_index.get(device_id)
+        if index is None:
+            index = len(self._device_index)
+            if not self.can_add(device_id):
+                raise ValueError(f"id {device_id!r} não cabe no buffer compartilhado")
+            self.names[index] = device_id.encode()
+            self._device_index[device_id] = index
+            self.header[1] = index + 1  # Publica o nome antes de qualquer amostra que o use
+        return index
+
+    def write(self, kind, device_id, t, dados):
+        """Grava uma amostra (só campos do dicionário do formato compacto) e a publica"""
+        values = [np.nan] * len(FIELD_NAMES)
+        tables = 0
+        for field, value in dados.items():
+            field_id = FIELD_IDS.get(field)
+            if field_id is None:
+                continue
+            if isinstance(value, dict):
+                value = value.get("amount")
+                tables |= 1 << field_id
+            if isinstance(value, (int, float)):
+                values[field_id] = value
+
+        seq = int(self.header[0])
+        slot = seq % self.capacity
+        self.seqs[slot] = UNWRITTEN  # Leitor atrasado que esteja lendo esta posição descarta o que leu
+        self.times[slot] = t
+        self.kinds[slot] = KIND_INDEX[kind]
+        self.devices[slot] = self._device(device_id)
+        self.tables[slot] = tables
+        self.values[slot] = values
+        self.seqs[slot] = seq
+        self.header[0] = seq + 1  # Só agora os leitores enxergam a posição
+
+
+class RingReader:
+    """Cursor de um leitor; cada processo consumidor tem o seu"""
+
+    def __init__(self, ring, start=None):
+        self.ring = ring
+        self.cursor = ring.write_seq if start is None else start
+        self.lost = 0  # Amostras sobrescritas antes de serem lidas (leitor lento demais)
+        self._names = []
+
+    def device_name(self, index):
+        if index >= len(self._names):
+            count = int(self.ring.header[1])
+            self._names = [name.decode(errors="replace") for name in self.ring.names[:count]]
+        return self._names[index]
+
+    def poll(self):
+        """Fatias (visões, sem cópia) das posições publicadas desde a última chamada.
+
+        Devolve uma lista de (seq inicial, slice); as posições vão de seq em seq.
+        """
+        ring = self.ring
+        end = ring.write_seq
+        start = self.cursor
+        if end - start > ring.capacity:
+            self.lost += end - ring.capacity - start
+            start = end - ring.capacity
+        batches = []
+        while start < end:
+            slot = start % ring.capacity
+            count = min(end - start, ring.capacity - slot)
+            batches.append((start, slice(slot, slot + count)))
+            start += count
+        self.cursor = end
+        return batches
+
+    def samples(self):
+        """Itera (tipo, id, t, dados) das amostras novas; dados só com os campos presentes"""
+        ring = self.ring
+        for first_seq, window in self.poll():
+            times = ring.times[window]
+            kinds = ring.kinds[window]
+            devices = ring.devices[window]
+            tables = ring.tables[window]
+            values = ring.values[window]
+            seqs = ring.seqs[window]
+            present = ~np.isnan(values)
+            for i in range(len(times)):
+                dados = {}
+                table_bits = int(tables[i])
+                for field_id in np.flatnonzero(present[i]):
+                    value = float(values[i, field_id])
+                    dados[FIELD_NAMES[field_id]] = {"amount": value} if table_bits >> field_id & 1 else value
+                sample = (KINDS[kinds[i]], self.device_name(int(devices[i])), float(times[i]), dados)
+                # Conferida depois da leitura: se o escritor deu a volta nesse meio-tempo, descarta
+                if seqs[i] != first_seq + i:
+                    self.lost += 1
+                    continue
+                yield sample
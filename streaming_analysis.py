@@ -0,0 +1,276 @@
+# streaming_analysis.py
+from collections import deque
+
+from derived_metrics import LEVEL_FIELDS
+from predictive_alerts import ALERT_RULES, SEVERITY_STATUS, PredictiveAlerts
+
+
+class RollingStats:
+    """Estatísticas incrementais de uma série: EWMA, mín/máx e inclinação numa janela de tempo.
+
+    Cada amostra custa O(1) amortizado; nada é recalculado sobre o histórico.
+    """
+    __slots__ = ("window", "alpha", "ewma", "last", "last_time", "count",
+                 "_samples", "_min", "_max", "_origin", "_st", "_sv", "_stt", "_stv")
+
+    def __init__(self, window=60.0, alpha=0.2):
+        self.window = window
+        self.alpha = alpha
+        self.ewma = None
+        self.last = None
+        self.last_time = None
+        self.count = 0
+        self._samples = deque()  # (t, v) dentro da janela
+        self._min = deque()      # Deques monotônicos para mín/máx da janela
+        self._max = deque()
+        self._origin = None      # Referência de tempo das somas (evita perda de precisão com epoch)
+        self._st = self._sv = self._stt = self._stv = 0.0
+
+    def add(self, t, value):
+        self.count += 1
+        self.last = value
+        self.last_time = t
+        self.ewma = value if self.ewma is None else self.ewma + self.alpha * (value - self.ewma)
+
+        if self._origin is None or t - self._origin > 64 * self.window:
+            self._rebase(t)
+
+        self._samples.append((t, value))
+        x = t - self._origin
+        self._st += x
+        self._sv += value
+        self._stt += x * x
+        self._stv += x * value
+
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append((t, value))
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((t, value))
+
+        self._evict(t - self.window)
+
+    def _evict(self, cutoff):
+        samples = self._samples
+        while samples[0][0] < cutoff:
+            t, value = samples.popleft()
+            x = t - self._origin
+            self._st -= x
+            self._sv -= value
+            self._stt -= x * x
+            self._stv -= x * value
+        while self._min[0][0] < cutoff:
+            self._min.popleft()
+        while self._max[0][0] < cutoff:
+            self._max.popleft()
+
+    def _rebase(self, t):
+        # Raro (uma vez a cada 64 janelas): recalcula as somas em relação a um novo tempo de referência
+        self._origin = t
+        self._st = self._sv = self._stt = self._stv = 0.0
+        for sample_t, value in self._samples:
+            x = sample_t - t
+            self._st += x
+            self._sv += value
+            self._stt += x * x
+            self._stv += x * value
+
+    def export(self):
+        """Estado completo para o checkpoint: (escalares, amostras, deque de mín, deque de máx)"""
+        scalars = (self.window, self.alpha, self.ewma, self.last, self.last_time, self.count,
+                   self._origin, self._st, self._sv, self._stt, self._stv)
+        return scalars, list(self._samples), list(self._min), list(self._max)
+
+    @classmethod
+    def restore(cls, scalars, samples, minimum, maximum):
+        """Inverso de export(): a janela volta sem recalcular nada"""
+        stat = cls.__new__(cls)
+        (stat.window, stat.alpha, stat.ewma, stat.last, stat.last_time, stat.count,
+         stat._origin, stat._st, stat._sv, stat._stt, stat._stv) = scalars
+        stat._samples = deque(samples)
+        stat._min = deque(minimum)
+        stat._max = deque(maximum)
+        return stat
+
+    @property
+    def minimum(self):
+        return self._min[0][1] if self._min else None
+
+    @property
+    def maximum(self):
+        return self._max[0][1] if self._max else None
+
+    @property
+    def slope(self):
+        """Inclinação (unidades por segundo) da regressão linear sobre a janela"""
+        n = len(self._samples)
+        if n < 2:
+            return 0.0
+        denominator = n * self._stt - self._st * self._st
+        if denominator <= 1e-12:
+            return 0.0
+        return (n * self._stv - self._st * self._sv) / denominator
+
+    def summary(self):
+        return {
+            "ultimo": self.last,
+            "media_movel": self.ewma,
+            "minimo": self.minimum,
+            "maximo": self.maximum,
+            "inclinacao": self.slope,
+        }
+
+
+class DeviceAnalysis:
+    """Estado de análise de um dispositivo, atualizado a cada amostra"""
+
+    def __init__(self, kind, device_id, window=60.0):
+        self.kind = kind
+        self.device_id = device_id
+        self.window = window
+        self.stats = {}
+        self.severity = 0
+        self.alerts = []
+        self.predictions = {}  # Regra -> segundos até cruzar o limite
+        self._summary = None
+
+    def _stat(self, field):
+        stat = self.stats.get(field)
+        if stat is None:
+            stat = self.stats[field] = RollingStats(self.window)
+        return stat
+
+    def update(self, t, values):
+        """values: {campo: float} da amostra (sample_codec.validate)"""
+        for field, value in values.items():
+            self._stat(field).add(t, value)
+
+        # Séries de ocupação (0..1) usadas pelas regras; a taxa e o tempo até esvaziar vêm de derived_metrics
+        for level_field, capacity_field in LEVEL_FIELDS:
+            level = self.stats.get(level_field)
+            capacity = self.stats.get(capacity_field)
+            if level is not None and capacity is not None and capacity.last_time == t and capacity.last > 0:
+                self._stat(f"{level_field}_fill").add(t, level.last / capacity.last)
+
+        self._summary = None
+
+    def set_alerts(self, severity, alerts, predictions):
+        """Resultado da avaliação em lote das regras (AnalysisEngine.evaluate)"""
+        self.severity = severity
+        self.alerts = alerts
+        self.predictions = predictions
+        self._summary = None
+
+    def summary(self):
+        """Resumo das estatísticas (calculado uma vez por amostra nova)"""
+        if self._summary is None:
+            self._summary = {
+                "status": SEVERITY_STATUS[self.severity],
+                "alertas": list(self.alerts),
+                "previsoes": dict(self.predictions),
+                "campos": {field: stat.summary() for field, stat in self.stats.items()},
+            }
+        return self._summary
+
+
+class AnalysisEngine:
+    """Mantém a análise incremental de todos os dispositivos"""
+
+    def __init__(self, window=60.0, rules=ALERT_RULES):
+        self.window = window
+        self.devices = {}
+        self._by_id = {}  # id anunciado -> análises (reator e/ou turbina daquele id)
+        self._rows = {}   # análise -> linha no avaliador de alertas
+        self.predictive = PredictiveAlerts(rules, window)
+        self._pending = False  # Há amostras ainda não avaliadas pelas regras
+
+    def update(self, kind, device_id, t, values):
+        analysis = self.devices.get((kind, device_id))
+        if analysis is None:
+            analysis = self.devices[(kind, device_id)] = DeviceAnalysis(kind, device_id, self.window)
+            self._by_id.setdefault(device_id, []).append(analysis)
+            self._rows[analysis] = self.predictive.row(kind, device_id)
+        analysis.update(t, values)
+
+        # Só os campos usados pelas regras vão para o avaliador em lote
+        row = self._rows[analysis]
+        for field in self.predictive.fields:
+            stat = analysis.stats.get(field)
+            if stat is not None and stat.last_time == t:
+                self.predictive.add(row, field, t, stat.last)
+        self._pending = True
+        return analysis
+
+    def evaluate(self):
+        """Avalia todas as regras para todos os dispositivos de uma vez (se chegou amostra nova)"""
+        if not self._pending:
+            return
+        self._pending = False
+        results = self.predictive.evaluate()
+        for analysis, row in self._rows.items():
+            analysis.set_alerts(*results[row])
+
+    def checkpoint_state(self):
+        """Janelas, alertas e matrizes do avaliador, para o checkpoint do servidor"""
+        self.evaluate()
+        return {
+            "window": self.window,
+            "devices": [{
+                "kind": analysis.kind,
+                "id": analysis.device_id,
+                "severity": analysis.severity,
+                "alerts": list(analysis.alerts),
+                "predictions": dict(analysis.predictions),
+                "stats": {field: stat.export() for field, stat in analysis.stats.items()},
+            } for analysis in self.devices.values()],
+            "predictive": self.predictive.checkpoint_state(),
+        }
+
+    def restore_state(self, state):
+        """Recria a análise a partir de checkpoint_state() (engine recém-criado)"""
+        self.predictive.restore_state(state["predictive"])
+        for entry in state["devices"]:
+            kind, device_id = entry["kind"], entry["id"]
+            analysis = self.devices[(kind, device_id)] = DeviceAnalysis(kind, device_id, self.window)
+            analysis.stats = {field: RollingStats.restore(*exported) for field, exported in entry["stats"].items()}
+            analysis.set_alerts(entry["severity"], entry["alerts"], entry["predictions"])
+            self._by_id.setdefault(device_id, []).append(analysis)
+            self._rows[analysis] = self.predictive.row(kind, device_id)
+
+    def alert_state(self, device_ids=None):
+        """Status e alertas por dispositivo (sem as estatísticas), para snapshot e dashboards (última avaliação)"""
+        selected = [analysis for analysis in self.devices.values()
+                    if device_ids is None or analysis.device_id in device_ids]
+        severity = max((analysis.severity for analysis in selected), default=0)
+        return {
+            "status_sistema": SEVERITY_STATUS[severity] if selected else "AGUARDANDO_DADOS",
+            "alertas": [alert for analysis in selected for alert in analysis.alerts],
+            "dispositivos": {f"{analysis.kind}:{analysis.device_id}": {
+                "status": SEVERITY_STATUS[analysis.severity],
+                "alertas": analysis.alerts,
+                "previsoes": analysis.predictions,
+            } for analysis in selected},
+        }
+
+    def report(self, device_id=None):
+        """Resposta do solicitar_analise: status geral, alertas e resumo por dispositivo.
+
+        Os alertas são os da última avaliação (evaluate(), chamada periodicamente pelo servidor):
+        responder não reavalia as regras de todos os dispositivos.
+        """
+        if device_id is None:
+            selected = list(self.devices.values())
+        else:
+            selected = self._by_id.get(device_id, [])
+        if not selected:
+            return {"status_sistema": "AGUARDANDO_DADOS", "alertas": [], "dispositivos": {}}
+
+        severity = max(analysis.severity for analysis in selected)
+        alerts = [alert for analysis in selected for alert in analysis.alerts]
+        return {
+            "status_sistema": SEVERITY_STATUS[severity],
+            "alertas": alerts,
+            "dispositivos": {f"{analysis.kind}:{analysis.device_id}": analysis.summary()
+                             for analysis in selected},
+        }
@@ -0,0 +1,270 @@
+# timeseries_store.py
+import logging
+import os
+import struct
+import threading
+import time
+from urllib.parse import quote, unquote
+
+logger = logging.getLogger("fusion")
+
+# Registros binários de largura fixa (little-endian)
+RAW_RECORD = struct.Struct('<dd')          # timestamp, valor
+ROLLUP_RECORD = struct.Struct('<dddddQ')   # início do bucket, mínimo, máximo, soma, último, contagem
+
+# Resoluções armazenadas: tamanho do bucket, duração de cada segmento e retenção (segundos)
+RESOLUTIONS = {
+    "raw": {"bucket": None, "segment": 6 * 3600, "retention": 7 * 86400},
+    "1s": {"bucket": 1, "segment": 86400, "retention": 86400},
+    "1m": {"bucket": 60, "segment": 30 * 86400, "retention": 90 * 86400},
+    "1h": {"bucket": 3600, "segment": 365 * 86400, "retention": None},
+}
+ROLLUP_LEVELS = ("1s", "1m", "1h")
+
+SEGMENT_SUFFIX = ".seg"
+
+
+def numeric_fields(dados):
+    """Extrai os campos numéricos de uma amostra (tabelas do Mekanism usam 'amount')"""
+    for field, value in dados.items():
+        if isinstance(value, dict):
+            value = value.get("amount")
+        if isinstance(value, (int, float)):
+            yield field, float(value)
+
+
+def record_struct(resolution):
+    return RAW_RECORD if resolution == "raw" else ROLLUP_RECORD
+
+
+class _Rollup:
+    """Acumulador do bucket aberto de uma resolução agregada"""
+    __slots__ = ("start", "minimum", "maximum", "total", "last", "count")
+
+    def __init__(self, start, value):
+        self.start = start
+        self.minimum = value
+        self.maximum = value
+        self.total = value
+        self.last = value
+        self.count = 1
+
+    def add(self, value):
+        if value < self.minimum:
+            self.minimum = value
+        if value > self.maximum:
+            self.maximum = value
+        self.total += value
+        self.last = value
+        self.count += 1
+
+    def pack(self):
+        return ROLLUP_RECORD.pack(self.start, self.minimum, self.maximum, self.total, self.last, self.count)
+
+
+class _Series:
+    """Estado de escrita de um campo de um dispositivo"""
+    __slots__ = ("last_time", "pending", "rollups")
+
+    def __init__(self):
+        self.last_time = float("-inf")
+        # Bytes ainda não gravados, por (resolução, início do segmento)
+        self.pending = {}
+        self.rollups = {}
+
+
+class TimeSeriesStore:
+    """Armazenamento append-only em segmentos binários: <root>/<dispositivo>/<campo>/<resolução>/<início>.seg"""
+
+    def __init__(self, root="fusion_history", retention=None, retention_check_interval=60):
+        self.root = root
+        self.retention = {name: spec["retention"] for name, spec in RESOLUTIONS.items()}
+        if retention:
+            self.retention.update(retention)
+        self.retention_check_interval = retention_check_interval
+        self._series = {}
+        self._lock = threading.Lock()
+        self._last_retention_check = 0.0
+        os.makedirs(self.root, exist_ok=True)
+
+    def append_sample(self, device, timestamp, dados):
+        """Adiciona todos os campos numéricos de uma amostra"""
+        self.append_values(device, timestamp, dict(numeric_fields(dados)))
+
+    def append_values(self, device, timestamp, values):
+        """Adiciona os valores já decodificados de uma amostra ({campo: float})"""
+        with self._lock:
+            for field, value in values.items():
+                self._append(device, field, timestamp, value)
+
+    def append(self, device, field, timestamp, value):
+        with self._lock:
+            self._append(device, field, timestamp, float(value))
+
+    def _append(self, device, field, timestamp, value):
+        series = self._series.get((device, field))
+        if series is None:
+            series = self._series[(device, field)] = _Series()
+
+        # Mantém cada série ordenada no tempo (permite busca binária na leitura)
+        if timestamp < series.last_time:
+            timestamp = series.last_time
+        series.last_time = timestamp
+
+        self._buffer(series, "raw", timestamp, RAW_RECORD.pack(timestamp, value))
+
+        for level in ROLLUP_LEVELS:
+            bucket = RESOLUTIONS[level]["bucket"]
+            bucket_start = timestamp - (timestamp % bucket)
+            rollup = series.rollups.get(level)
+            if rollup is None:
+                series.rollups[level] = _Rollup(bucket_start, value)
+            elif rollup.start == bucket_start:
+                rollup.add(value)
+            else:
+                # Bucket fechado: vira um registro no segmento da resolução
+                self._buffer(series, level, rollup.start, rollup.pack())
+                series.rollups[level] = _Rollup(bucket_start, value)
+
+    def _buffer(self, series, resolution, timestamp, record):
+        span = RESOLUTIONS[resolution]["segment"]
+        segment_start = int(timestamp // span * span)
+        key = (resolution, segment_start)
+        buffer = series.pending.get(key)
+        if buffer is None:
+            buffer = series.pending[key] = bytearray()
+        buffer += record
+
+    def flush(self, now=None, close_rollups=False):
+        """Grava os registros pendentes no disco (pode rodar fora do event loop).
+
+        close_rollups=True (ao encerrar) grava também os buckets agregados em aberto. Se o bucket
+        continuar depois do reinício, fica com dois registros de mesmo início, que as leituras
+        agregadas somam normalmente.
+        """
+        with self._lock:
+            batches = []
+            for (device, field), series in self._series.items():
+                if close_rollups:
+                    for level, rollup in series.rollups.items():
+                        self._buffer(series, level, rollup.start, rollup.pack())
+                    series.rollups = {}
+                for (resolution, segment_start), buffer in series.pending.items():
+                    batches.append((device, field, resolution, segment_start, bytes(buffer)))
+                series.pending = {}
+
+        failed = []
+        for batch in batches:
+            try:
+                self._write_batch(*batch)
+            except OSError as e:
+                logger.error("Erro ao gravar histórico de %s/%s: %s", batch[0], batch[1], e)
+                failed.append(batch)
+        if failed:
+            # Voltam para a frente da fila (antes do que chegou durante a escrita) e vão no próximo flush
+            with self._lock:
+                for device, field, resolution, segment_start, data in failed:
+                    series = self._series[(device, field)]
+                    key = (resolution, segment_start)
+                    series.pending[key] = bytearray(data) + series.pending.get(key, b"")
+
+        now = time.time() if now is None else now
+        if now - self._last_retention_check >= self.retention_check_interval:
+            self._last_retention_check = now
+            self.apply_retention(now)
+
+    def _write_batch(self, device, field, resolution, segment_start, data):
+        directory = self._series_dir(device, field, resolution)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"{segment_start}{SEGMENT_SUFFIX}"), 'ab') as f:
+            size = f.tell()
+            try:
+                f.write(data)
+                f.flush()
+            except OSError:
+                # Sem registro pela metade: o lote inteiro é regravado depois
+                f.truncate(size)
+                raise
+
+    def apply_retention(self, now=None):
+        """Remove segmentos inteiramente mais antigos que a retenção da resolução"""
+        now = time.time() if now is None else now
+        removed = 0
+        for device in self.devices():
+            for field in self.fields(device):
+                for resolution, retention in self.retention.items():
+                    if retention is None:
+                        continue
+                    span = RESOLUTIONS[resolution]["segment"]
+                    for segment_start, path in self._segments(device, field, resolution):
+                        if segment_start + span < now - retention:
+                            os.remove(path)
+                            removed += 1
+        return removed
+
+    def devices(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(unquote(name) for name in os.listdir(self.root)
+                      if os.path.isdir(os.path.join(self.root, name)))
+
+    def fields(self, device):
+        directory = os.path.join(self.root, quote(device, safe=''))
+        if not os.path.isdir(directory):
+            return []
+        return sorted(unquote(name) for name in os.listdir(directory))
+
+    def segment_paths(self, device, field, resolution="raw", start=None, end=None):
+        """Caminhos dos segmentos que cobrem o intervalo [start, end], em ordem cronológica"""
+        span = RESOLUTIONS[resolution]["segment"]
+        return [path for segment_start, path in self._segments(device, field, resolution)
+                if (start is None or segment_start + span > start)
+                and (end is None or segment_start <= end)]
+
+    def read(self, device, field, start=None, end=None, resolution="raw"):
+        """Lê os registros de um campo no intervalo, incluindo os ainda não gravados"""
+        record = record_struct(resolution)
+        records = []
+        for path in self.segment_paths(device, field, resolution, start, end):
+            with open(path, 'rb') as f:
+                data = f.read()
+            # Descarta um registro parcial no fim (escrita interrompida)
+            usable = len(data) - len(data) % record.size
+            records.extend(record.iter_unpack(memoryview(data)[:usable]))
+
+        with self._lock:
+            series = self._series.get((device, field))
+            if series is not None:
+                for (pending_resolution, _), buffer in sorted(series.pending.items()):
+                    if pending_resolution == resolution:
+                        records.extend(record.iter_unpack(bytes(buffer)))
+
+        return [r for r in records
+                if (start is None or r[0] >= start) and (end is None or r[0] <= end)]
+
+    def unflushed(self, device, field, resolution="raw"):
+        """Registros ainda não gravados de uma resolução, incluindo o bucket agregado em aberto"""
+        with self._lock:
+            series = self._series.get((device, field))
+            if series is None:
+                return b""
+            data = b"".join(bytes(buffer) for (pending_resolution, _), buffer in sorted(series.pending.items())
+                            if pending_resolution == resolution)
+            rollup = series.rollups.get(resolution)
+            if rollup is not None:
+                data += rollup.pack()
+            return data
+
+    def _series_dir(self, device, field, resolution):
+        return os.path.join(self.root, quote(device, safe=''), quote(field, safe=''), resolution)
+
+    def _segments(self, device, field, resolution):
+        directory = self._series_dir(device, field, resolution)
+        if not os.path.isdir(directory):
+            return []
+        segments = []
+        for name in os.listdir(directory):
+            if name.endswith(SEGMENT_SUFFIX):
+                segments.append((int(name[:-len(SEGMENT_SUFFIX)]), os.path.join(directory, name)))
+        segments.sort()
+        return segments
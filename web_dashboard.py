@@ -0,0 +1,149 @@
+# web_dashboard.py
+import asyncio
+import logging
+import os
+import time
+from http import HTTPStatus
+
+from downsampling import minmax
+from history_query import read_records
+from sample_codec import dumps
+
+logger = logging.getLogger("fusion")
+
+PAGE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "painel.html")
+PAGE_ROUTES = ("/", "/painel")
+
+# Séries desenhadas no painel (e enviadas no histórico de quem acaba de entrar)
+CHART_FIELDS = {
+    "reactor": ("plasma_temperature", "case_temperature"),
+    "turbine": ("production_rate",),
+}
+CATCHUP_POINTS = 600  # Pontos por série no histórico inicial
+
+
+class WebDashboard:
+    """Painel web servido pelo próprio FusionServer (mesma porta do WebSocket).
+
+    A cada tick monta um único quadro com os dispositivos que mudaram, serializa uma vez e
+    enfileira o mesmo texto para todos os navegadores; o custo por espectador é só o envio.
+    """
+
+    def __init__(self, server, tick=0.5, catchup_seconds=600):
+        self.server = server
+        self.tick = tick
+        self.catchup_seconds = catchup_seconds
+        self.viewers = set()
+        self.frames = 0
+        self._changed = {}  # chave -> DeviceState alterado desde o último quadro
+        self._last_alerts = None
+        self._catchup = None  # (quadro, payload) do histórico inicial, reaproveitado no mesmo tick
+        self._task = None
+        with open(PAGE_PATH, encoding="utf-8") as f:
+            self.page = f.read()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def process_request(self, connection, request):
+        """Hook do websockets.serve: GET comum em / ou /painel devolve a página"""
+        if request.headers.get("Upgrade", "").lower() == "websocket":
+            return None
+        if request.path.split("?")[0] not in PAGE_ROUTES:
+            return connection.respond(HTTPStatus.NOT_FOUND, "not found\n")
+        response = connection.respond(HTTPStatus.OK, self.page)
+        del response.headers["Content-Type"]
+        response.headers["Content-Type"] = "text/html; charset=utf-8"
+        return response
+
+    def mark(self, state):
+        """Registra que o dispositivo mudou; vai no próximo quadro"""
+        self._changed[state.key] = state
+
+    async def add_viewer(self, websocket):
+        """Envia o histórico recente e passa a incluir o navegador nos quadros"""
+        if self._catchup is None or self._catchup[0] != self.frames:
+            self._catchup = (self.frames, await self.build_catchup())
+        self.server.send_raw(websocket, self._catchup[1])
+        self.viewers.add(websocket)
+
+    def remove_viewer(self, websocket):
+        self.viewers.discard(websocket)
+        if not self.viewers:
+            # Sem espectadores não há quadros: o contador para e o histórico guardado envelheceria
+            self._catchup = None
+
+    def device_entry(self, state):
+        return {"tipo": state.kind, "id": state.device_id, "dados": state.data, "derivados": state.derived,
+                "t": state.updated_at}
+
+    async def build_catchup(self):
+        """Histórico dos últimos minutos (agregação de 1s do histórico em disco) e estado atual"""
+        now = time.time()
+        # Cópia: dispositivos anunciados durante as leituras (fora do event loop) não alteram a iteração
+        states = [state for kind_states in self.server.devices.values() for state in list(kind_states.values())]
+        series = {}
+        store = self.server.store
+        if store is not None:
+            for state in states:
+                series[state.key] = await asyncio.to_thread(
+                    self._read_series, store, state.key, CHART_FIELDS[state.kind], now - self.catchup_seconds, now)
+
+        return dumps({
+            "tipo": "historico",
+            "t": now,
+            "series": series,
+            "dispositivos": {state.key: self.device_entry(state) for state in states},
+            "analise": self.server.analysis.alert_state(),
+        })
+
+    @staticmethod
+    def _read_series(store, device, fields, start, end):
+        result = {}
+        for field in fields:
+            # Agregação de 1s mapeada em memória: só a fatia [start, end] é copiada
+            records = read_records(store, device, field, "1s", start, end + 1)
+            if not len(records):
+                continue
+            t, v = minmax(records["t"], records["last"], CATCHUP_POINTS // 2)
+            result[field] = [[round(float(a), 3), float(b)] for a, b in zip(t, v)]
+        return result
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                self.broadcast_frame()
+            except Exception as e:
+                logger.error("Erro ao montar quadro do painel: %s", e)
+
+    def broadcast_frame(self):
+        """Monta e envia o quadro do tick (nada se não houve mudança)"""
+        if not self.viewers:
+            return  # _changed fica limitado a uma entrada por dispositivo
+
+        alerts = self.server.analysis.alert_state()
+        alerts_changed = alerts != self._last_alerts
+        if not self._changed and not alerts_changed:
+            return
+
+        frame = {
+            "tipo": "quadro",
+            "t": time.time(),
+            "dispositivos": {key: self.device_entry(state) for key, state in self._changed.items()},
+        }
+        if alerts_changed:
+            frame["analise"] = alerts
+            self._last_alerts = alerts
+        self._changed = {}
+
+        payload = dumps(frame)  # Uma serialização para todos os espectadores
+        self.frames += 1
+        for websocket in self.viewers:
+            self.server.send_raw(websocket, payload)
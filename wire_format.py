@@ -0,0 +1,93 @@
+# wire_format.py
+# Formato compacto negociado: dicionário de ids de campos + frames-chave ("k") e deltas ("d").
+#
+# {"tipo": "k", "d": "r", "i": "reator-1", "s": 12, "ts": 1700000000000, "c": [3, 1.2e8, 4, 3.1e6], "x": {...}}
+#   d  = tipo do dispositivo ("r" reator, "t" turbina)
+#   i  = id do dispositivo (opcional dentro de um lote)
+#   s  = sequência do frame daquele dispositivo
+#   c  = pares [id do campo, valor, ...]; no "k" é o estado completo, no "d" só o que mudou
+#   x  = campos fora do dicionário, pelo nome
+from sample_codec import normalize_id
+
+WIRE_VERSION = 1
+
+FIELD_NAMES = (
+    "deuterium", "deuterium_capacity", "injection_rate", "plasma_temperature", "case_temperature",
+    "water", "water_capacity", "steam", "steam_capacity", "production_rate",
+    "energy", "max_energy", "flow_rate", "max_flow_rate", "max_production",
+)
+FIELD_IDS = {name: i for i, name in enumerate(FIELD_NAMES)}
+
+FRAME_KINDS = {"r": "reactor", "t": "turbine"}
+FRAME_TYPES = ("k", "d")
+
+KEYFRAME_INTERVAL = 30  # Frames entre keyframes sugerido ao cliente
+
+
+class KeyframeRequired(Exception):
+    """Delta sem base válida (keyframe ausente ou frame perdido)"""
+
+    def __init__(self, kind, device_id):
+        super().__init__(f"keyframe necessário para {kind}:{device_id}")
+        self.kind = kind
+        self.device_id = device_id
+
+
+def negotiation_reply():
+    """Resposta ao "negociar": dicionário de campos e intervalo de keyframes"""
+    return {
+        "tipo": "formato",
+        "formato": "delta",
+        "versao": WIRE_VERSION,
+        "campos": list(FIELD_NAMES),
+        "intervalo_chave": KEYFRAME_INTERVAL,
+    }
+
+
+class DeltaDecoder:
+    """Reconstrói amostras completas a partir de keyframes e deltas"""
+
+    def __init__(self):
+        self._last_seq = {}  # (tipo, id) -> último frame aplicado
+
+    def decode(self, frame, current_data, default_id):
+        """Retorna (tipo, id, dados, seq) aplicando o frame sobre os dados atuais do dispositivo.
+
+        O frame só vira base para os próximos deltas com commit(), depois que a amostra for aceita.
+        """
+        kind = FRAME_KINDS[frame["d"]]
+        device_id = normalize_id(frame.get("i"), default_id)
+        key = (kind, device_id)
+        seq = frame.get("s")
+
+        if frame["tipo"] == "k":
+            dados = {}
+        else:
+            last_seq = self._last_seq.get(key)
+            if current_data is None or last_seq is None or (seq is not None and seq != last_seq + 1):
+                self._last_seq.pop(key, None)
+                raise KeyframeRequired(kind, device_id)
+            dados = dict(current_data)
+
+        pairs = frame.get("c") or ()
+        if isinstance(pairs, dict):
+            # textutils.serializeJSON transforma a tabela vazia em {}
+            pairs = ()
+        for i in range(0, len(pairs) - 1, 2):
+            field_id = int(pairs[i])
+            if 0 <= field_id < len(FIELD_NAMES):
+                dados[FIELD_NAMES[field_id]] = pairs[i + 1]
+
+        extras = frame.get("x")
+        if extras:
+            dados.update(extras)
+
+        return kind, device_id, dados, seq
+
+    def commit(self, kind, device_id, seq):
+        """Frame aplicado ao estado do dispositivo: o próximo delta deve vir com seq + 1"""
+        self._last_seq[(kind, device_id)] = seq if seq is not None else 0
+
+    def reset(self, kind, device_id):
+        """Frame rejeitado: o próximo delta do dispositivo exige keyframe"""
+        self._last_seq.pop((kind, device_id), None)